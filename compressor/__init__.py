@@ -0,0 +1,14 @@
+from .backends import (
+    Backend, BackendUnavailable, InProcessSevenZipBackend, SevenZipProcessBackend,
+    SizeSelectingBackend, ZipBackend, create_backend, find_seven_zip
+)
+from .batching import BatchOptions, group_small_items
+from .engine import ARCHIVE_FORMATS, CompressionEngine
+from .items import BATCH, DIR, FILE, Batch, Item
+from .filetypes import (
+    ARCHIVE, COMPRESSED_EXTENSIONS, COMPRESSIBLE, DENSE, DENSE_EXTENSIONS, Classifier, classify,
+    is_compressed_file, is_incompressible
+)
+from .jobs import DONE, SKIPPED
+from .manifest import ManifestReadError, UnsupportedFormatError, iter_manifest_rows
+from .scheduler import CompressionScheduler, default_workers
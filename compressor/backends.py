@@ -0,0 +1,441 @@
+import importlib.util
+import lzma
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+
+from .items import BATCH, Item
+from .memory import JOB_OVERHEAD, lzma_memory
+from .metrics import timed
+from .profiles import AUTO, PROFILES, dictionary_size, resolve_file_profile, resolve_profile
+from .progress import parse_seven_zip_progress, report_bytes, report_fraction
+from .filetypes import is_compressed_file
+from .parallel_zip import ParallelZipWriter
+from .scanner import scan_tree
+from .runner import process_runner
+
+SEVEN_ZIP_MISSING = "7-Zip not found. Please install 7-Zip from https://www.7-zip.org/"
+
+# Names 7-Zip is installed under on PATH: p7zip ships 7z and 7za, the
+# official Linux/macOS builds ship 7zz
+SEVEN_ZIP_NAMES = ('7z', '7za', '7zz')
+
+# File sizes timed when choosing between in-process and subprocess 7z
+CALIBRATION_SIZES = (16 * 1024, 256 * 1024, 2 * 1024 * 1024, 16 * 1024 * 1024)
+# Random part of each piece of the calibration samples
+SAMPLE_BLOCK = 1024
+
+
+class BackendUnavailable(Exception):
+    pass
+
+
+def find_seven_zip():
+    # Try to find 7-Zip in common installation locations
+    possible_paths = [
+        r"C:\Program Files\7-Zip\7z.exe",
+        r"C:\Program Files (x86)\7-Zip\7z.exe"
+    ]
+    for path in possible_paths:
+        if os.path.exists(path):
+            return path
+
+    # Then anything on PATH
+    for name in SEVEN_ZIP_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+class Backend:
+    # Writes one item into an archive at the given path. One instance is
+    # shared by all worker threads, so it only holds plain settings.
+    name = None
+    extension = None
+    # runner.JobControl of the running scheduler: jobs check it to stop
+    # when cancelled or out of time
+    control = None
+
+    def set_workers(self, workers):
+        pass
+
+    def set_control(self, control):
+        self.control = control
+
+    def check(self, item):
+        if self.control:
+            self.control.check(item.path)
+
+    def prepare(self):
+        # Called once before a run starts, on the scheduler thread
+        pass
+
+    def write(self, item, archive_path, profile):
+        # profile is a name from profiles.PROFILE_CHOICES, resolved by the
+        # backend per archive or per member
+        raise NotImplementedError
+
+    def memory_estimate(self, item, profile):
+        # Bytes a job writing this item may hold at its peak, reserved from
+        # the scheduler's memory budget while it runs
+        return JOB_OVERHEAD
+
+    def input_size(self, item):
+        # Bytes of the item that go into its archive
+        return item.size
+
+    def verify(self, item, archive_path):
+        # Reads the finished archive back and checks every member's CRC;
+        # raises if any is damaged
+        raise NotImplementedError
+
+
+def estimate_profile(name):
+    # Auto resolves per item inside the job; plan for the heaviest choice
+    return PROFILES['max'] if name == AUTO else PROFILES[name]
+
+
+class ZipBackend(Backend):
+    # Members are deflated on a thread pool shared by all archives (zlib
+    # releases the GIL) and appended in order by the job's own thread, so
+    # one large folder or file keeps every core busy, and many small items
+    # still run side by side.
+    name = 'zip'
+    extension = 'zip'
+
+    def __init__(self, window=None):
+        self.window = window
+
+    def set_workers(self, workers):
+        # Chunks each archive may have in flight: enough to keep the pool
+        # busy when a single job runs, without every job holding that much
+        self.window = max(2, 2 * (os.cpu_count() or 1) // max(1, workers))
+
+    def memory_estimate(self, item, profile):
+        return ParallelZipWriter.memory_needed(self.window or 2) + JOB_OVERHEAD
+
+    def input_size(self, item):
+        # Already-compressed members of a folder are left out
+        if item.is_dir:
+            return sum(size for _, _, size, _ in self.entries(item))
+        return item.size
+
+    def write(self, item, archive_path, profile):
+        with ParallelZipWriter(archive_path, self.window or 2) as writer:
+            for path, arcname, size, mtime in self.entries(item):
+                # zip compresses every member on its own, so auto mode can
+                # store a jpg and deflate the text file next to it
+                member_profile = resolve_file_profile(profile, path, size, mtime)
+                writer.add(
+                    path, arcname, member_profile.zip_method, member_profile.zip_level,
+                    on_read=lambda n: self.read(item, n)
+                )
+
+    def read(self, item, nbytes):
+        # Called for every chunk, so a cancelled job stops within a chunk
+        report_bytes(item.path, nbytes)
+        self.check(item)
+
+    def verify(self, item, archive_path):
+        with timed('verify'), zipfile.ZipFile(archive_path) as archive:
+            bad_member = archive.testzip()
+        if bad_member is not None:
+            raise Exception(f"Verification failed: {bad_member} is damaged in {archive_path}")
+
+    def entries(self, item):
+        # (path, name in the archive, size, mtime) of each member, the last
+        # two as discovery or the scan recorded them
+        if item.kind == BATCH:
+            for member in item.members:
+                yield member.path, member.name, member.size, member.mtime
+            return
+        if not item.is_dir:
+            yield item.path, item.name, item.size, item.mtime
+            return
+
+        for file_path, relpath, size, mtime in folder_contents(item).files():
+            # Skip if it's a compressed file
+            if is_compressed_file(relpath):
+                continue
+            yield file_path, relpath, size, mtime
+
+
+def folder_contents(item):
+    # Discovery scans folders once; items built elsewhere are scanned here
+    if item.contents is not None:
+        return item.contents
+    return scan_tree(item.path)
+
+
+def seven_zip_error(output):
+    # Drop the progress redraws (-bsp1) and keep the messages
+    text = output.decode(errors='replace').replace('\b', '')
+    lines = [line for line in text.splitlines() if line.strip() and not re.match(r'\s*\d+%', line)]
+    return '\n'.join(lines)
+
+
+class SevenZipProcessBackend(Backend):
+    # Runs the 7-Zip executable once per item
+    name = '7z'
+    extension = '7z'
+
+    def __init__(self, seven_zip_path, threads=1):
+        self.seven_zip_path = seven_zip_path
+        self.threads = threads
+
+    def set_workers(self, workers):
+        # Split the cores between concurrent 7-Zip processes so that
+        # workers * -mmt stays close to the number of cores
+        self.threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+
+    def memory_estimate(self, item, profile):
+        # LZMA2 runs one encoder per two threads
+        streams = max(1, self.threads // 2)
+        return lzma_memory(dictionary_size(estimate_profile(profile)), streams)
+
+    def write(self, item, archive_path, profile):
+        switches = resolve_profile(profile, item).seven_zip_switches
+        if item.kind == BATCH:
+            names = [member.name for member in item.members]
+        elif item.is_dir and item.contents is not None and item.contents.filtered:
+            # 7-Zip would add everything below the folder; list what the
+            # scan kept instead (files only, a listed folder is recursed)
+            names = [item.name + '/' + relpath for _, relpath, _, _ in item.contents.files()]
+        else:
+            self.run_seven_zip(archive_path, [item.path], switches, item.path)
+            return
+
+        # Batches and filtered folders go through a list file instead of the
+        # command line, which would overflow long before a batch is full.
+        # Paths are given relative to the parent folder so the archive holds
+        # the same names as when the item is added directly.
+        list_path = archive_path + '.list'
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for name in names:
+                f.write(name + '\n')
+        try:
+            self.run_seven_zip(
+                os.path.abspath(archive_path), [f'@{os.path.abspath(list_path)}'],
+                switches + ['-scsUTF-8'],  # List file encoding
+                item.path, cwd=os.path.dirname(item.path) or None
+            )
+        finally:
+            os.remove(list_path)
+
+    def verify(self, item, archive_path):
+        cmd = [self.seven_zip_path, 't', '-bso0', '-bsp0', archive_path]
+        with timed('verify'):
+            returncode, output = process_runner().run(cmd)
+        if returncode != 0:
+            raise Exception(f"Verification failed: {seven_zip_error(output)}")
+
+    def run_seven_zip(self, archive_path, targets, switches, progress_key, cwd=None):
+        cmd = [
+            self.seven_zip_path,
+            'a',  # Add files to archive
+            '-t7z',  # Use 7z format
+            f'-mmt={self.threads}',  # Threads this job may use
+            '-bso0',  # No standard output messages
+            '-bsp1',  # Progress percentages on stdout
+            *switches,
+            archive_path,
+            *targets
+        ]
+
+        def on_output(previous, chunk):
+            # A percentage can be split over two reads, so parse with the
+            # end of the previous output in front
+            percent = parse_seven_zip_progress(previous + chunk)
+            if percent is not None:
+                report_fraction(progress_key, percent / 100)
+
+        # stderr is merged into stdout so one reader can follow the progress
+        # as it is printed. The shared runner stops the process when the job
+        # is cancelled or times out.
+        returncode, output = process_runner().run(cmd, on_output, cwd, self.control, progress_key)
+        if returncode != 0:
+            raise Exception(f"7-Zip error: {seven_zip_error(output)}")
+
+
+class InProcessSevenZipBackend(Backend):
+    # Writes .7z archives with py7zr (LZMA2 through the lzma module) inside
+    # the worker, saving a process launch per item. lzma releases the GIL
+    # while compressing, so threads are enough.
+    name = 'py7zr'
+    extension = '7z'
+
+    @staticmethod
+    def is_available():
+        return importlib.util.find_spec('py7zr') is not None
+
+    def memory_estimate(self, item, profile):
+        return lzma_memory(dictionary_size(estimate_profile(profile)))
+
+    def write(self, item, archive_path, profile):
+        import py7zr
+
+        lzma_options = resolve_profile(profile, item).lzma_options
+        if lzma_options is None:
+            filters = [{'id': py7zr.FILTER_COPY}]
+        else:
+            filters = [dict(lzma_options, id=lzma.FILTER_LZMA2)]
+
+        with py7zr.SevenZipFile(archive_path, 'w', filters=filters) as archive:
+            # A member being compressed cannot be interrupted; the job
+            # stops between members
+            if item.kind == BATCH:
+                for member in item.members:
+                    self.check(item)
+                    archive.write(member.path, member.name)
+            elif item.is_dir:
+                archive.write(item.path, item.name)
+                for record in folder_contents(item):
+                    self.check(item)
+                    arcname = item.name + '/' + record.path
+                    archive.write(os.path.join(item.path, record.path), arcname)
+            else:
+                archive.write(item.path, item.name)
+
+    def verify(self, item, archive_path):
+        import py7zr
+
+        with timed('verify'), py7zr.SevenZipFile(archive_path, 'r') as archive:
+            bad_member = archive.testzip()
+        if bad_member is not None:
+            raise Exception(f"Verification failed: {bad_member} is damaged in {archive_path}")
+
+
+class SizeSelectingBackend(Backend):
+    # Sends files and batches smaller than threshold to the small backend
+    # and everything else (including folders) to the large one. Without a threshold, one is
+    # measured by calibrate() when the run starts.
+    name = 'auto'
+
+    def __init__(self, small, large, threshold=None):
+        self.small = small
+        self.large = large
+        self.threshold = threshold
+        self.extension = large.extension
+
+    def set_workers(self, workers):
+        self.small.set_workers(workers)
+        self.large.set_workers(workers)
+
+    def set_control(self, control):
+        self.control = control
+        self.small.set_control(control)
+        self.large.set_control(control)
+
+    def prepare(self):
+        if self.threshold is None:
+            self.threshold = calibrate(self.small, self.large)
+
+    def select(self, item):
+        if not item.is_dir and self.threshold is not None and item.size < self.threshold:
+            return self.small
+        return self.large
+
+    def memory_estimate(self, item, profile):
+        return self.select(item).memory_estimate(item, profile)
+
+    def input_size(self, item):
+        return self.select(item).input_size(item)
+
+    def write(self, item, archive_path, profile):
+        self.select(item).write(item, archive_path, profile)
+
+    def verify(self, item, archive_path):
+        self.select(item).verify(item, archive_path)
+
+
+def _sample_data(size):
+    # Random bytes interleaved with repetitive text, a third and two thirds
+    # of every 3 KB: roughly what a mixed tree compresses like. Mixed all
+    # the way through, so the start of the file is not judged dense and
+    # stored, which would time storing instead of LZMA2.
+    text = b"The quick brown fox jumps over the lazy dog. 0123456789\n"
+    text_block = (text * (SAMPLE_BLOCK * 2 // len(text) + 1))[:SAMPLE_BLOCK * 2]
+    blocks = []
+    for _ in range(size // (SAMPLE_BLOCK * 3) + 1):
+        blocks.append(os.urandom(SAMPLE_BLOCK))
+        blocks.append(text_block)
+    return b''.join(blocks)[:size]
+
+
+def _time_backend(backend, item, archive_path):
+    start = time.perf_counter()
+    backend.write(item, archive_path, 'max')
+    elapsed = time.perf_counter() - start
+    os.remove(archive_path)
+    return elapsed
+
+
+def benchmark_backends(small, large, sizes=CALIBRATION_SIZES):
+    # Returns [(size, small_seconds, large_seconds), ...]
+    results = []
+    with tempfile.TemporaryDirectory(prefix="compressor-calibrate-") as temp_dir:
+        for size in sizes:
+            sample_path = os.path.join(temp_dir, f"sample-{size}.bin")
+            with open(sample_path, 'wb') as f:
+                f.write(_sample_data(size))
+            item = Item.from_stat(sample_path, os.stat(sample_path))
+            archive_path = os.path.join(temp_dir, f"sample-{size}.{large.extension}")
+            results.append((
+                size,
+                _time_backend(small, item, archive_path),
+                _time_backend(large, item, archive_path),
+            ))
+    return results
+
+
+_calibration_cache = {}
+_calibration_lock = threading.Lock()
+
+
+def calibrate(small, large, sizes=CALIBRATION_SIZES):
+    # The smallest sample size at which the large backend is at least as fast;
+    # if it never is, everything up to the largest sample stays in-process
+    key = (type(small), type(large), getattr(large, 'seven_zip_path', None))
+    with _calibration_lock:
+        if key not in _calibration_cache:
+            threshold = sizes[-1]
+            for size, small_time, large_time in benchmark_backends(small, large, sizes):
+                if large_time <= small_time:
+                    threshold = size
+                    break
+            _calibration_cache[key] = threshold
+        return _calibration_cache[key]
+
+
+def create_backend(archive_format, seven_zip_path=None, choice='auto', threshold=None):
+    # choice only matters for 7z: 'process' (7-Zip executable), 'inprocess'
+    # (py7zr) or 'auto' (both, picked per item by size)
+    if archive_format == 'zip':
+        return ZipBackend()
+    if archive_format != '7z':
+        raise ValueError(f"Unsupported archive format: {archive_format}")
+
+    in_process = InProcessSevenZipBackend() if InProcessSevenZipBackend.is_available() else None
+    process = SevenZipProcessBackend(seven_zip_path) if seven_zip_path else None
+
+    if choice == 'process':
+        if not process:
+            raise BackendUnavailable(SEVEN_ZIP_MISSING)
+        return process
+    if choice == 'inprocess':
+        if not in_process:
+            raise BackendUnavailable("The in-process 7z backend needs py7zr (pip install py7zr)")
+        return in_process
+    if choice != 'auto':
+        raise ValueError(f"Unsupported backend: {choice}")
+
+    if in_process and process:
+        return SizeSelectingBackend(in_process, process, threshold)
+    if process or in_process:
+        return process or in_process
+    raise BackendUnavailable(SEVEN_ZIP_MISSING)
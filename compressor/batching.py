@@ -0,0 +1,79 @@
+import json
+import os
+from collections import OrderedDict, namedtuple
+
+from .items import Batch, FILE
+from .filetypes import is_compressed_file
+
+# Sidecar written next to every batch archive, listing what went into it
+INDEX_SUFFIX = '.index.json'
+
+# max_item_size: files below this are batched. max_bytes / max_items: caps
+# on a single batch archive.
+BatchOptions = namedtuple('BatchOptions', ['max_item_size', 'max_bytes', 'max_items'],
+                          defaults=[1024 * 1024, 64 * 1024 * 1024, 1000])
+
+# Parent folders with a partly filled batch kept open at once; beyond this
+# the oldest is flushed so memory stays bounded on scattered manifests
+MAX_OPEN_GROUPS = 256
+
+
+def is_batch_index(path):
+    return path.endswith(INDEX_SUFFIX)
+
+
+def batch_base_path(parent, number):
+    parent_name = os.path.basename(os.path.normpath(parent))
+    prefix = f"{parent_name}-batch" if parent_name else "batch"
+    return os.path.join(parent, f"{prefix}-{number:04d}")
+
+
+def group_small_items(items, options=BatchOptions()):
+    # Packs small files from the same folder into Batches; folders, large
+    # files and already compressed files pass through on their own. A group
+    # that ends up with a single file is passed through as that file.
+    groups = OrderedDict()
+    counters = {}
+
+    def flush(parent):
+        members, _ = groups.pop(parent)
+        if len(members) == 1:
+            return members[0]
+        counters[parent] = counters.get(parent, 0) + 1
+        return Batch(batch_base_path(parent, counters[parent]), tuple(members))
+
+    for item in items:
+        if item.kind != FILE or item.size >= options.max_item_size or is_compressed_file(item.path):
+            yield item
+            continue
+
+        parent = os.path.dirname(item.path)
+        members, size = groups.setdefault(parent, ([], 0))
+        members.append(item)
+        size += item.size
+        groups[parent] = (members, size)
+        groups.move_to_end(parent)
+
+        if len(members) >= options.max_items or size >= options.max_bytes:
+            yield flush(parent)
+        elif len(groups) > MAX_OPEN_GROUPS:
+            yield flush(next(iter(groups)))
+
+    while groups:
+        yield flush(next(iter(groups)))
+
+
+def write_batch_index(batch, archive_path):
+    index = {
+        'archive': os.path.basename(archive_path),
+        'members': [
+            {'name': member.name, 'size': member.size, 'mtime': member.mtime}
+            for member in batch.members
+        ],
+    }
+    index_path = archive_path + INDEX_SUFFIX
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=1)
+    os.replace(temp_path, index_path)
+    return index_path
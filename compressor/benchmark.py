@@ -0,0 +1,448 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+from .backends import BackendUnavailable
+from .discovery import discover_items
+from .engine import CompressionEngine
+from .jobs import DONE, archive_path_for
+from .manifest import UnsupportedFormatError, iter_manifest_rows
+from .memory import MB
+from .profiles import PROFILE_CHOICES
+from .scanner import ScanOptions, scan_tree
+
+# Synthetic trees; sizes are multiplied by --scale
+TREE_KINDS = ('tiny', 'huge', 'mixed')
+MANIFEST_FORMATS = ('xlsx', 'ods', 'csv', 'txt')
+DEFAULT_ROWS = (1000, 10000, 100000, 1000000)
+
+TINY_FOLDERS = 50
+TINY_FILES_PER_FOLDER = 100
+HUGE_FILES = 2
+HUGE_FILE_SIZE = 64 * 1024 * 1024
+MIXED_FILES = 200
+BLOCK_SIZE = 1024 * 1024
+
+# Seconds between two checks that a case's process is still alive
+RESULT_POLL = 5.0
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut "
+    "labore et dolore magna aliqua invoice customer order total date amount status pending shipped "
+    "2024 2025 0001 0002 warehouse north south east west report summary"
+).split()
+
+# Starts of real formats, so the classifier sees the files as precompressed
+JPEG_HEADER = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00'
+
+
+def text_block(rng, size):
+    # Log-like text: compresses about as well as CSV exports and reports
+    lines = []
+    length = 0
+    while length < size:
+        line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 14))) + "\n"
+        lines.append(line)
+        length += len(line)
+    return "".join(lines).encode()[:size]
+
+
+def write_text_file(path, rng, size):
+    # Large text files repeat a handful of varied blocks, which keeps
+    # generation fast without making them trivially compressible
+    blocks = [text_block(rng, min(size, BLOCK_SIZE)) for _ in range(4)]
+    with open(path, 'wb') as f:
+        written = 0
+        while written < size:
+            block = rng.choice(blocks)[:size - written]
+            f.write(block)
+            written += len(block)
+
+
+def random_bytes(rng, size):
+    return rng.getrandbits(size * 8).to_bytes(size, 'little')
+
+
+def write_random_file(path, rng, size, header=b''):
+    with open(path, 'wb') as f:
+        f.write(header)
+        written = len(header)
+        while written < size:
+            n = min(BLOCK_SIZE, size - written)
+            f.write(random_bytes(rng, n))
+            written += n
+
+
+def generate_tree(root, kind, seed=0, scale=1.0):
+    # Deterministic for a given (kind, seed, scale)
+    rng = random.Random(f"{kind}-{seed}")
+    os.makedirs(root, exist_ok=True)
+    if kind == 'tiny':
+        for folder in range(TINY_FOLDERS):
+            folder_path = os.path.join(root, f"folder{folder:03d}")
+            os.makedirs(folder_path, exist_ok=True)
+            for number in range(max(1, int(TINY_FILES_PER_FOLDER * scale))):
+                size = rng.randint(100, 4096)
+                path = os.path.join(folder_path, f"note{number:04d}.txt")
+                with open(path, 'wb') as f:
+                    f.write(text_block(rng, size))
+    elif kind == 'huge':
+        size = max(BLOCK_SIZE, int(HUGE_FILE_SIZE * scale))
+        write_text_file(os.path.join(root, "export.csv"), rng, size)
+        for number in range(1, HUGE_FILES):
+            write_random_file(os.path.join(root, f"disk{number}.img"), rng, size)
+    elif kind == 'mixed':
+        for number in range(max(1, int(MIXED_FILES * scale))):
+            size = rng.randint(16 * 1024, 2 * 1024 * 1024)
+            folder_path = os.path.join(root, f"set{number % 10}")
+            os.makedirs(folder_path, exist_ok=True)
+            choice = number % 4
+            if choice == 0:
+                write_text_file(os.path.join(folder_path, f"report{number}.txt"), rng, size)
+            elif choice == 1:
+                write_random_file(os.path.join(folder_path, f"data{number}.bin"), rng, size)
+            elif choice == 2:
+                write_random_file(os.path.join(folder_path, f"photo{number}.jpg"), rng, size, JPEG_HEADER)
+            else:
+                with open(os.path.join(folder_path, f"log{number}.gz"), 'wb') as f:
+                    f.write(zlib.compress(text_block(rng, size), 6))
+    else:
+        raise ValueError(f"Unknown tree kind: {kind}")
+
+
+def manifest_paths(rng, rows, roots):
+    for number in range(rows):
+        root = roots[number % len(roots)]
+        yield os.path.join(root, f"folder{rng.randrange(1000):03d}", f"file{number:07d}.txt")
+
+
+def write_xlsx_manifest(path, paths):
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["Path"])
+    for row in paths:
+        sheet.append([row])
+    workbook.save(path)
+
+
+ODS_MANIFEST = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" '
+    'manifest:version="1.2">'
+    '<manifest:file-entry manifest:full-path="/" '
+    'manifest:media-type="application/vnd.oasis.opendocument.spreadsheet"/>'
+    '<manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>'
+    '</manifest:manifest>'
+)
+ODS_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+    'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" '
+    'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" office:version="1.2">'
+    '<office:body><office:spreadsheet><table:table table:name="Sheet1">'
+)
+ODS_FOOTER = '</table:table></office:spreadsheet></office:body></office:document-content>'
+ODS_ROW = '<table:table-row><table:table-cell office:value-type="string"><text:p>{}</text:p></table:table-cell></table:table-row>'
+
+
+def write_ods_manifest(path, paths):
+    # Written by hand so generating a million rows does not need odfpy
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as ods:
+        ods.writestr(zipfile.ZipInfo("mimetype"), "application/vnd.oasis.opendocument.spreadsheet")
+        ods.writestr("META-INF/manifest.xml", ODS_MANIFEST)
+        with ods.open("content.xml", 'w') as content:
+            content.write(ODS_HEADER.encode())
+            content.write(ODS_ROW.format("Path").encode())
+            for row in paths:
+                content.write(ODS_ROW.format(escape(row)).encode())
+            content.write(ODS_FOOTER.encode())
+
+
+def write_csv_manifest(path, paths):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Path"])
+        for row in paths:
+            writer.writerow([row])
+
+
+def write_txt_manifest(path, paths):
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in paths:
+            f.write(row + "\n")
+
+
+MANIFEST_WRITERS = {
+    'xlsx': write_xlsx_manifest, 'ods': write_ods_manifest,
+    'csv': write_csv_manifest, 'txt': write_txt_manifest,
+}
+
+
+def generate_manifest(path, manifest_format, rows, roots, seed=0):
+    rng = random.Random(f"manifest-{rows}-{seed}")
+    MANIFEST_WRITERS[manifest_format](path, manifest_paths(rng, rows, roots))
+
+
+def peak_rss():
+    # (own peak, peak of the largest finished child) in bytes, or None
+    # where the resource module is missing (Windows)
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit,
+    )
+
+
+def bench_reader(path):
+    start = time.perf_counter()
+    try:
+        count = sum(1 for _ in iter_manifest_rows(path))
+    except UnsupportedFormatError:
+        return {'error': 'unsupported'}
+    seconds = time.perf_counter() - start
+    return {'rows_read': count, 'seconds': seconds, 'rows_per_second': count / seconds if seconds else None}
+
+
+def bench_scan(root):
+    start = time.perf_counter()
+    records = scan_tree(root, ScanOptions(depth=None))
+    seconds = time.perf_counter() - start
+    return {
+        'entries': len(records), 'bytes': records.total_size, 'seconds': seconds,
+        'entries_per_second': len(records) / seconds if seconds else None,
+    }
+
+
+def bench_compress(root, archive_format, workers, profile, seven_zip_path=None, backend='auto', depth=1):
+    # Archives go to a temporary output root, so the reused source trees
+    # never hold archives that would skew later cases (skipped as existing,
+    # counted by the scan), even when a run is interrupted
+    with tempfile.TemporaryDirectory(prefix="compressor-bench-") as output_root:
+        engine = CompressionEngine(
+            archive_format, workers, seven_zip_path, incremental=False, journal=False, backend=backend,
+            profile=profile, scan_options=ScanOptions(depth=depth), output_root=output_root
+        )
+        try:
+            backend = engine.create_backend()
+        except BackendUnavailable as e:
+            return {'error': str(e)}
+
+        items = list(discover_items([root], options=engine.scan_options))
+        archives = []
+        compressed = []
+
+        def on_result(item, status, message):
+            if status == DONE:
+                archives.append(archive_path_for(item, archive_format, engine.output_root))
+                compressed.append(item)
+
+        start = time.perf_counter()
+        summary = engine.compress(items, on_result=on_result)
+        seconds = time.perf_counter() - start
+
+        # Only what went into the archives: skipped items and members left
+        # out as already compressed would inflate the ratio and throughput
+        input_bytes = sum(backend.input_size(item) for item in compressed)
+        output_bytes = sum(os.path.getsize(path) for path in archives)
+    return {
+        'items': len(items), 'failed': summary['failed'], 'input_bytes': input_bytes,
+        'output_bytes': output_bytes, 'ratio': output_bytes / input_bytes if input_bytes else None,
+        'seconds': seconds, 'mb_per_second': input_bytes / seconds / MB if seconds else None,
+    }
+
+
+def _run_measured(function, kwargs, results):
+    try:
+        result = function(**kwargs)
+    except Exception as e:
+        result = {'error': f"{type(e).__name__}: {e}"}
+    result['peak_rss'], result['peak_rss_children'] = peak_rss()
+    results.put(result)
+
+
+def run_isolated(function, **kwargs):
+    # Every case gets a fresh interpreter, so peak RSS is the case's own
+    # and earlier cases do not leave warm caches behind in the process
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_measured, args=(function, kwargs, results))
+    process.start()
+    while True:
+        try:
+            result = results.get(timeout=RESULT_POLL)
+            break
+        except queue.Empty:
+            pass
+        if not process.is_alive():
+            # Gone without a result (e.g. the OOM killer); one last look in
+            # case it was put just before the process exited
+            try:
+                result = results.get(timeout=RESULT_POLL)
+            except queue.Empty:
+                result = {'error': f"Case process exited with code {process.exitcode}"}
+            break
+    process.join()
+    return result
+
+
+def prepare_work_dir(work_dir, trees, manifest_formats, rows, seed, scale, echo):
+    # Generated inputs are reused when they were made with the same settings
+    tree_roots = {}
+    for kind in trees:
+        root = os.path.join(work_dir, 'trees', kind)
+        marker = root + '.json'
+        settings = {'seed': seed, 'scale': scale}
+        try:
+            with open(marker, encoding='utf-8') as f:
+                current = json.load(f) == settings
+        except (OSError, ValueError):
+            current = False
+        if not current:
+            echo(f"Generating {kind} tree...")
+            shutil.rmtree(root, ignore_errors=True)
+            generate_tree(root, kind, seed, scale)
+            with open(marker, 'w', encoding='utf-8') as f:
+                json.dump(settings, f)
+        tree_roots[kind] = root
+
+    manifests = []
+    roots = list(tree_roots.values()) or [work_dir]
+    for manifest_format in manifest_formats:
+        for count in rows:
+            path = os.path.join(work_dir, 'manifests', f"manifest-{count}-{seed}.{manifest_format}")
+            if not os.path.exists(path):
+                echo(f"Generating {count} row {manifest_format} manifest...")
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                generate_manifest(path + '.tmp', manifest_format, count, roots, seed)
+                os.replace(path + '.tmp', path)
+            manifests.append((manifest_format, count, path))
+    return tree_roots, manifests
+
+
+def comma_list(convert=str):
+    def parse(value):
+        return [convert(part) for part in value.split(',') if part]
+    return parse
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m compressor.benchmark",
+        description="Time manifest readers, scanning and compression on generated data; results go to JSON."
+    )
+    parser.add_argument("--work-dir", default=None,
+                        help="where generated trees and manifests are kept and reused "
+                             "(default: a temporary folder removed afterwards)")
+    parser.add_argument("-o", "--output", default="benchmark-results.json",
+                        help="JSON file for the results (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the generated data")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiplies file counts (tiny, mixed) and file sizes (huge)")
+    parser.add_argument("--trees", type=comma_list(), default=list(TREE_KINDS),
+                        help="trees to generate: " + ",".join(TREE_KINDS))
+    parser.add_argument("--rows", type=comma_list(int), default=list(DEFAULT_ROWS),
+                        help="manifest sizes (default: %(default)s)")
+    parser.add_argument("--manifest-formats", type=comma_list(), default=list(MANIFEST_FORMATS),
+                        help="manifest formats: " + ",".join(MANIFEST_FORMATS))
+    parser.add_argument("--formats", type=comma_list(), default=["zip", "7z"],
+                        help="archive formats to time (default: zip,7z)")
+    parser.add_argument("--workers", type=comma_list(int), default=sorted({1, os.cpu_count() or 1}),
+                        help="worker counts to time (default: 1 and the CPU count)")
+    parser.add_argument("--profiles", type=comma_list(), default=["fast", "balanced", "max"],
+                        help="profiles to time: " + ",".join(PROFILE_CHOICES))
+    parser.add_argument("--backend", choices=("auto", "process", "inprocess"), default="auto",
+                        help="7z backend (default: auto)")
+    parser.add_argument("--seven-zip", dest="seven_zip_path", default=None, help="path to the 7-Zip executable")
+    parser.add_argument("--depth", type=int, default=1,
+                        help="item depth inside each tree, as for the compressor; -1 makes every file an item")
+    parser.add_argument("--skip", type=comma_list(), default=[],
+                        help="phases to leave out: readers,scan,compress")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    for kind in args.trees:
+        if kind not in TREE_KINDS:
+            raise SystemExit(f"Unknown tree: {kind}")
+    for profile in args.profiles:
+        if profile not in PROFILE_CHOICES:
+            raise SystemExit(f"Unknown profile: {profile}")
+
+    def echo(message):
+        print(message, file=sys.stderr, flush=True)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="compressor-benchmark-")
+    report = {
+        'meta': {
+            'time': time.time(), 'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), 'seed': args.seed, 'scale': args.scale,
+        },
+        'results': [],
+    }
+
+    def record(case, result):
+        result = dict(case, **result)
+        report['results'].append(result)
+        echo(json.dumps(result))
+
+    try:
+        readers = 'readers' not in args.skip
+        tree_roots, manifests = prepare_work_dir(
+            work_dir, args.trees, args.manifest_formats if readers else [], args.rows, args.seed, args.scale, echo
+        )
+
+        for manifest_format, rows, path in manifests:
+            record({'phase': 'reader', 'manifest_format': manifest_format, 'rows': rows},
+                   run_isolated(bench_reader, path=path))
+
+        if 'scan' not in args.skip:
+            for kind, root in tree_roots.items():
+                record({'phase': 'scan', 'tree': kind}, run_isolated(bench_scan, root=root))
+
+        if 'compress' not in args.skip:
+            for kind, root in tree_roots.items():
+                for archive_format in args.formats:
+                    for workers in args.workers:
+                        for profile in args.profiles:
+                            case = {
+                                'phase': 'compress', 'tree': kind, 'archive_format': archive_format,
+                                'workers': workers, 'profile': profile,
+                            }
+                            record(case, run_isolated(
+                                bench_compress, root=root, archive_format=archive_format, workers=workers,
+                                profile=profile, seven_zip_path=args.seven_zip_path, backend=args.backend,
+                                depth=None if args.depth == -1 else args.depth
+                            ))
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+    echo(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,11 @@
+import hashlib
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_checksum(path, algorithm='sha256'):
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,312 @@
+import argparse
+import sys
+import threading
+
+from .backends import BackendUnavailable, SizeSelectingBackend, benchmark_backends
+from .batching import BatchOptions
+from .dedup import DEDUP_MODES
+from .engine import ARCHIVE_FORMATS, CompressionEngine
+from .profiles import PROFILE_CHOICES
+from .progress import ProgressReporter, ProgressTracker, format_snapshot
+from .jobs import CANCELLED, DONE
+from .memory import MB
+from .metrics import CAPTURE_MODES, METRICS_FORMATS, Capture, Metrics, MetricsWriter, install_metrics
+from .scanner import SYMLINK_POLICIES, ScanOptions
+from .manifest import STDIN, ManifestReadError, UnsupportedFormatError
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m compressor",
+        description="Compress the files and folders listed in a spreadsheet, CSV/TSV file or list of paths."
+    )
+    parser.add_argument("manifest", nargs="?",
+                        help="xlsx/xls/ods/csv/tsv file with the paths in its first column (first row is a "
+                             "header), or a plain list of paths, one per line or NUL-separated; '-' reads "
+                             "the list from standard input. The format is detected from the content")
+    parser.add_argument("-f", "--format", dest="archive_format", choices=ARCHIVE_FORMATS, default="zip",
+                        help="archive format to create (default: zip)")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of items compressed at the same time (default: based on CPU count)")
+    parser.add_argument("--seven-zip", dest="seven_zip_path", default=None,
+                        help="path to the 7-Zip executable")
+    parser.add_argument("-p", "--profile", choices=PROFILE_CHOICES, default=None,
+                        help="compression profile; auto test-compresses a sample of each file and picks "
+                             "store/fast/balanced/max from the result (default: balanced for zip, max for 7z)")
+    parser.add_argument("--backend", choices=("auto", "process", "inprocess"), default="auto",
+                        help="7z only: run the 7-Zip executable, write in-process with py7zr, "
+                             "or pick per file by size (default: auto)")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="time the in-process and 7-Zip backends on sample files and exit")
+    parser.add_argument("-o", "--output", dest="output_root", default=None, metavar="DIR",
+                        help="write the archives below DIR, mirroring the full path of each source "
+                             "(default: next to the source)")
+    parser.add_argument("--per-device", dest="device_limit", type=int, default=None, metavar="N",
+                        help="at most N jobs reading from or writing to the same disk at once; jobs for "
+                             "other disks start meanwhile (default: no limit)")
+    parser.add_argument("--dedup", choices=DEDUP_MODES, default=None,
+                        help="compress byte-identical files once; each copy gets an index file pointing "
+                             "at the archive holding the content, or a hard link to that archive")
+    parser.add_argument("--verify", action="store_true",
+                        help="test every new archive (CRC of each member) while the next items are compressed; "
+                             "damaged archives are removed and compressed once more")
+    parser.add_argument("--verify-workers", type=int, default=None, metavar="N",
+                        help="archives tested at the same time (default: half the workers)")
+    parser.add_argument("--job-timeout", type=float, default=None, metavar="SECONDS",
+                        help="stop a job that runs longer than this and count its item as failed; a 7-Zip "
+                             "process is terminated, partial archives are removed (default: no limit)")
+    parser.add_argument("--memory-limit", type=int, default=None, metavar="MB",
+                        help="memory the running jobs may use together; jobs wait for memory instead of "
+                             "starting when it is used up. 0 turns the limit off (default: half of the RAM)")
+    parser.add_argument("--batch", action="store_true",
+                        help="pack small files from the same folder into shared archives")
+    parser.add_argument("--batch-file-size", type=int, default=BatchOptions().max_item_size, metavar="BYTES",
+                        help="files smaller than this are batched (default: %(default)s)")
+    parser.add_argument("--batch-bytes", type=int, default=BatchOptions().max_bytes, metavar="BYTES",
+                        help="maximum total size of one batch (default: %(default)s)")
+    parser.add_argument("--batch-items", type=int, default=BatchOptions().max_items, metavar="N",
+                        help="maximum number of files in one batch (default: %(default)s)")
+    parser.add_argument("--depth", type=int, default=ScanOptions().depth,
+                        help="folder levels of a listed folder that become separate items; 0 compresses "
+                             "the folder as one item, -1 every file on its own (default: %(default)s)")
+    parser.add_argument("--include", action="append", default=[], metavar="GLOB",
+                        help="only compress files matching this pattern (repeatable); patterns with a / "
+                             "match the path below the listed folder, others the file name")
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="leave out files and folders matching this pattern (repeatable)")
+    parser.add_argument("--symlinks", choices=SYMLINK_POLICIES, default=ScanOptions().symlinks,
+                        help="skip symbolic links, follow links to files only, or follow all "
+                             "(default: %(default)s)")
+    parser.add_argument("--state", dest="state_path", default=None,
+                        help="state index used to skip unchanged items (default: <manifest>.state.sqlite)")
+    parser.add_argument("--no-state", action="store_true",
+                        help="skip items whose archive exists, without tracking changes")
+    parser.add_argument("--hash-sources", action="store_true",
+                        help="also store a content hash so touched but unmodified files are not redone")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted run: clean up its partial archives and skip what it "
+                             "finished")
+    parser.add_argument("--journal", dest="journal_path", default=None,
+                        help="run journal used by --resume (default: <manifest>.journal.jsonl)")
+    parser.add_argument("--no-journal", action="store_true",
+                        help="do not keep a run journal")
+    parser.add_argument("--metrics", dest="metrics_path", default=None, metavar="FILE",
+                        help="write per-phase timings, counters and queue depths to FILE every few seconds")
+    parser.add_argument("--metrics-format", choices=METRICS_FORMATS, default=None,
+                        help="JSON lines or a Prometheus text file (default: prometheus for *.prom, else json)")
+    parser.add_argument("--capture", choices=CAPTURE_MODES, default=None,
+                        help="profile the manifest reader, discovery and the compression loop with cProfile, "
+                             "or trace memory allocations with tracemalloc")
+    parser.add_argument("--capture-dir", default=".", metavar="DIR",
+                        help="where --capture writes its .pstats files or tracemalloc.txt (default: .)")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="only print warnings, errors and the final summary")
+    parser.add_argument("--no-progress", action="store_true",
+                        help="do not show the progress line (it is only shown on a terminal anyway)")
+    parser.add_argument("--gui", action="store_true",
+                        help="open the graphical interface instead")
+    return parser
+
+
+class ProgressPrinter:
+    # Redraws one progress line on stderr from the throttled snapshots
+    def __init__(self, reporter):
+        self.reporter = reporter
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="progress-printer", daemon=True)
+        self.lock = threading.Lock()
+        self.width = 0
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self._print(self.reporter.latest())
+        sys.stderr.write("\n")
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self._print(self.reporter.get(timeout=0.5))
+
+    def echo(self, message, file):
+        # Prints a message above the progress line, which is redrawn on the
+        # next snapshot
+        with self.lock:
+            sys.stderr.write("\r" + " " * self.width + "\r")
+            self.width = 0
+            print(message, file=file, flush=True)
+
+    def _print(self, snapshot):
+        if snapshot is None:
+            return
+        percent = snapshot.done_bytes / snapshot.total_bytes * 100 if snapshot.total_bytes else 0
+        line = f"{percent:5.1f}% {format_snapshot(snapshot)}"
+        line += f", {snapshot.items_done}/{snapshot.items_total} items"
+        if snapshot.workers:
+            line += " | " + " ".join(f"[{number}] {name} {fraction:.0%}" for number, name, fraction in snapshot.workers)
+        line = line[:150]
+        with self.lock:
+            sys.stderr.write("\r" + line.ljust(self.width))
+            sys.stderr.flush()
+            self.width = len(line)
+
+
+def calibrate(seven_zip_path):
+    engine = CompressionEngine('7z', seven_zip_path=seven_zip_path, backend='auto')
+    try:
+        backend = engine.create_backend()
+    except BackendUnavailable as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    if not isinstance(backend, SizeSelectingBackend):
+        print(f"Only the {backend.name} backend is available, nothing to compare")
+        return 0
+
+    print(f"{'size':>10}  {'in-process':>10}  {'7-Zip':>10}")
+    for size, small_time, large_time in benchmark_backends(backend.small, backend.large):
+        print(f"{size // 1024:>8}KB  {small_time:>9.3f}s  {large_time:>9.3f}s")
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.memory_limit is not None and args.memory_limit < 0:
+        parser.error("--memory-limit cannot be negative")
+    if args.verify_workers is not None and args.verify_workers < 1:
+        parser.error("--verify-workers must be at least 1")
+    if args.job_timeout is not None and args.job_timeout <= 0:
+        parser.error("--job-timeout must be more than 0")
+    if args.device_limit is not None and args.device_limit < 1:
+        parser.error("--per-device must be at least 1")
+    if args.resume and args.no_journal:
+        parser.error("--resume needs the run journal")
+    if args.depth < -1:
+        parser.error("--depth must be -1 or more")
+
+    metrics_writer, capture = start_metrics(args)
+    try:
+        return run(parser, args)
+    finally:
+        stop_metrics(metrics_writer, capture)
+
+
+def start_metrics(args):
+    metrics_writer = capture = None
+    if args.capture:
+        capture = Capture(args.capture, args.capture_dir).start()
+    if args.metrics_path or capture:
+        metrics = Metrics()
+        install_metrics(metrics, capture)
+        if args.metrics_path:
+            metrics_writer = MetricsWriter(metrics, args.metrics_path, args.metrics_format).start()
+    return metrics_writer, capture
+
+
+def stop_metrics(metrics_writer, capture):
+    if metrics_writer:
+        metrics_writer.stop()
+    if capture:
+        capture.stop()
+    install_metrics(None)
+
+
+def run(parser, args):
+    if args.gui:
+        # Tk (and winsound) are only loaded when the window is wanted
+        from .gui import run_gui
+        run_gui(args.archive_format)
+        return 0
+
+    if args.calibrate:
+        return calibrate(args.seven_zip_path)
+
+    if not args.manifest:
+        parser.error("a manifest file is required unless --gui is given")
+    if args.manifest == STDIN and args.resume and not args.journal_path:
+        parser.error("--resume with a manifest read from standard input needs --journal")
+
+    progress = reporter = printer = None
+    if not args.quiet and not args.no_progress and sys.stderr.isatty():
+        progress = ProgressTracker()
+        reporter = ProgressReporter(progress)
+        printer = ProgressPrinter(reporter)
+
+    def echo(message, file=sys.stdout):
+        if printer:
+            printer.echo(message, file)
+        else:
+            print(message, file=file, flush=True)
+
+    def on_status(message):
+        if not args.quiet or message.startswith("Warning"):
+            echo(message)
+
+    engine = CompressionEngine(
+        args.archive_format, args.workers, args.seven_zip_path, on_status=on_status,
+        incremental=not args.no_state, state_path=args.state_path, hash_sources=args.hash_sources,
+        backend=args.backend, profile=args.profile,
+        memory_limit=None if args.memory_limit is None else args.memory_limit * MB,
+        output_root=args.output_root, device_limit=args.device_limit, dedup=args.dedup,
+        verify=args.verify, verify_workers=args.verify_workers, job_timeout=args.job_timeout,
+        journal=not args.no_journal, journal_path=args.journal_path, resume=args.resume,
+        scan_options=ScanOptions(
+            None if args.depth == -1 else args.depth, tuple(args.include), tuple(args.exclude), args.symlinks
+        ),
+        batching=BatchOptions(args.batch_file_size, args.batch_bytes, args.batch_items) if args.batch else None
+    )
+    try:
+        engine.create_backend()
+    except BackendUnavailable as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    def on_result(item, status, message):
+        if not args.quiet or message.startswith("Warning"):
+            echo(message)
+
+    def on_error(item, error):
+        echo(f"Error compressing {item.name}: {error}", sys.stderr)
+
+    if reporter:
+        reporter.start()
+        printer.start()
+
+    try:
+        summary = engine.run(args.manifest, on_result=on_result, on_error=on_error, progress=progress)
+    except UnsupportedFormatError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        # The running jobs were stopped and their partial archives removed
+        if engine.resumable:
+            print("Cancelled; run again with --resume to continue", file=sys.stderr)
+        else:
+            print("Cancelled", file=sys.stderr)
+        return 130
+    except ManifestReadError as e:
+        print(f"Error: Failed to read file: {e}", file=sys.stderr)
+        return 2
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if reporter:
+            reporter.stop()
+            printer.stop()
+
+    if not sum(summary.values()):
+        print("Warning: No valid file paths found in the manifest", file=sys.stderr)
+        return 0
+
+    line = f"Done: {summary[DONE]} compressed, {summary['skipped']} skipped, {summary['failed']} failed"
+    if summary[CANCELLED]:
+        line += f", {summary[CANCELLED]} cancelled"
+    print(line)
+    return 1 if summary['failed'] else 0
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+
+from .batching import INDEX_SUFFIX
+from .checksums import file_checksum
+from .filetypes import is_compressed_file
+from .items import FILE, Duplicate
+from .metrics import count, timed
+
+# What happens to a file whose content was already compressed: an index
+# file pointing at the archive holding it, or a hard link to that archive
+DEDUP_INDEX = 'index'
+DEDUP_LINK = 'link'
+DEDUP_MODES = (DEDUP_INDEX, DEDUP_LINK)
+
+# Smaller files are compressed even when identical; their archive is not
+# much larger than the index entry would be
+MIN_SIZE = 4096
+
+# Same-sized candidates are first told apart by a hash of their start, so
+# files that differ early are not read to the end
+HEAD_SIZE = 64 * 1024
+HASH_ALGORITHM = 'blake2b'
+
+
+def normalize_path(path):
+    # The form two spellings of one path have in common: absolute, without
+    # ./.. or doubled separators, and case folded where the OS ignores case
+    return os.path.normcase(os.path.abspath(path))
+
+
+def head_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.blake2b(f.read(HEAD_SIZE), digest_size=16).digest()
+
+
+class _Candidate:
+    __slots__ = ('item', 'head', 'full')
+
+    def __init__(self, item):
+        self.item = item
+        self.head = None
+        self.full = None
+
+
+class Deduplicator:
+    # Drops items listed more than once, directly or through a listed
+    # folder that already covers them, and with content=True passes files
+    # whose bytes match an earlier file on as Duplicates of it. Files are
+    # grouped by size; only same-sized files are hashed, first their start
+    # and then, if that matches, all of them. The first copy always comes
+    # first, so it is compressed as usual.
+    def __init__(self, content=False, on_status=None):
+        self.content = content
+        self.on_status = on_status
+        self.seen = set()
+        self.by_size = {}
+
+    def update_status(self, message):
+        if self.on_status:
+            self.on_status(message)
+
+    def filter(self, items):
+        for item in items:
+            path = normalize_path(item.path)
+            if path in self.seen or self._covered(path):
+                count('skipped', reason='listed-twice')
+                self.update_status(f"Skipping path listed more than once: {item.path}")
+                continue
+            self.seen.add(path)
+            if self.content and item.kind == FILE and item.size >= MIN_SIZE and not is_compressed_file(item.path):
+                with timed('dedup-hash'):
+                    original = self._find_original(item)
+                if original is not None:
+                    yield Duplicate(item, original)
+                    continue
+            yield item
+
+    def _covered(self, path):
+        # Inside a folder that is compressed as one item already
+        parent = os.path.dirname(path)
+        while parent != path:
+            if parent in self.seen:
+                return True
+            path, parent = parent, os.path.dirname(parent)
+        return False
+
+    def _find_original(self, item):
+        candidates = self.by_size.setdefault(item.size, [])
+        new = _Candidate(item)
+        try:
+            for candidate in candidates:
+                if candidate.head is None:
+                    candidate.head = head_hash(candidate.item.path)
+                if new.head is None:
+                    new.head = head_hash(item.path)
+                if candidate.head != new.head:
+                    continue
+                if item.size > HEAD_SIZE:
+                    if candidate.full is None:
+                        candidate.full = file_checksum(candidate.item.path, HASH_ALGORITHM)
+                    if new.full is None:
+                        new.full = file_checksum(item.path, HASH_ALGORITHM)
+                    if candidate.full != new.full:
+                        continue
+                return candidate.item
+        except OSError:
+            # Unreadable now; compressing it will report why
+            return None
+        candidates.append(new)
+        return None
+
+
+def record_duplicate(duplicate, original_archive, archive_path, link=False):
+    # Makes archive_path stand for duplicate's content: a hard link to the
+    # original's archive, or an index next to where the archive would be.
+    # Returns how it was recorded.
+    os.makedirs(os.path.dirname(archive_path) or '.', exist_ok=True)
+    # Two sources can share an archive name (a.txt and a.log both give
+    # a.zip). An archive already at archive_path, the original's or another
+    # source's, is never replaced: os.link fails rather than overwrite, and
+    # the duplicate is indexed instead.
+    if link and normalize_path(archive_path) != normalize_path(original_archive):
+        try:
+            os.link(original_archive, archive_path)
+            return "linked to"
+        except FileExistsError:
+            if os.path.samefile(archive_path, original_archive):
+                # Linked by an earlier run
+                return "linked to"
+        except OSError:
+            # Other volume, or a file system without hard links
+            pass
+
+    index = {
+        'archive': os.path.relpath(original_archive, os.path.dirname(archive_path) or '.'),
+        'members': [{
+            'name': duplicate.name, 'size': duplicate.size, 'mtime': duplicate.mtime,
+            'stored_as': duplicate.original.name,
+        }],
+    }
+    index_path = archive_path + INDEX_SUFFIX
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=1)
+    os.replace(temp_path, index_path)
+    return "indexed as"
@@ -0,0 +1,77 @@
+import os
+import stat
+
+from .batching import is_batch_index
+from .dedup import normalize_path
+from .items import Item
+from .metrics import count, timed
+from .scanner import ScanOptions, iter_entries, scan_tree
+
+
+def make_item(path, st, options=ScanOptions(), base=''):
+    # Folders are scanned up front: the records are what gets compressed,
+    # their total size drives the progress and their newest mtime the
+    # incremental check
+    item = Item.from_stat(path, st)
+    if item.is_dir:
+        try:
+            with timed('scan'):
+                contents = scan_tree(path, options, base)
+        except OSError:
+            return item
+        item = item._replace(size=contents.total_size, mtime=contents.newest_mtime, contents=contents)
+    return item
+
+
+def discover_items(rows, on_status=None, options=ScanOptions()):
+    # Turns manifest rows into Items: each path is stat'ed exactly once and
+    # directories are expanded options.depth levels deep
+    def update_status(message):
+        if on_status:
+            on_status(message)
+
+    found = 0
+    listed = set()
+    for path in rows:
+        if not path:
+            continue
+        # The same path spelled differently is still read once
+        normalized = normalize_path(path)
+        if normalized in listed:
+            count('skipped', reason='listed-twice')
+            update_status(f"Skipping path listed more than once: {path}")
+            continue
+        listed.add(normalized)
+        try:
+            with timed('stat'):
+                st = os.stat(path)
+        except OSError:
+            count('skipped', reason='not-found')
+            update_status(f"Warning: Path not found - {path}")
+            continue
+
+        if not stat.S_ISDIR(st.st_mode) or options.depth == 0:
+            found += 1
+            update_status(f"Found valid path: {path}")
+            yield make_item(path, st, options)
+            continue
+
+        # Add the items in the directory to the list; folders above the
+        # depth limit are entered instead of becoming items themselves
+        for entry, entry_st, is_dir, relpath, depth in iter_entries(path, options, options.depth):
+            # Index files written next to batch archives are ours
+            if entry is None or is_batch_index(entry.name):
+                continue
+            if is_dir and (options.depth is None or depth < options.depth):
+                continue
+            found += 1
+            update_status(f"Found item in directory: {entry.path}")
+            item = make_item(entry.path, entry_st, options, relpath + '/')
+            if not item.dev:
+                # scandir's cached stat has no st_dev on Windows; below a
+                # listed folder it is almost always the folder's device
+                item = item._replace(dev=st.st_dev)
+            yield item
+
+    if found:
+        update_status(f"Loaded {found} items to process")
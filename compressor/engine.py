@@ -0,0 +1,213 @@
+import os
+import shutil
+import sqlite3
+
+from .discovery import discover_items
+from .jobs import CANCELLED
+from .journal import RunJournal
+from .backends import create_backend, find_seven_zip
+from .batching import group_small_items
+from .dedup import Deduplicator
+from .manifest import STDIN, iter_manifest_rows
+from .memory import default_memory_limit
+from .metrics import profiled, timed
+from .pipeline import run_pipeline
+from .scanner import ScanOptions
+from .scheduler import CompressionScheduler
+from .state import StateIndex
+
+ARCHIVE_FORMATS = ('zip', '7z')
+
+
+class CompressionEngine:
+    # The reading and compression side of the application, without any GUI.
+    # Status messages go to on_status(message) so the caller decides whether
+    # they end up in a label, on stdout or nowhere.
+    def __init__(self, archive_format='zip', workers=None, seven_zip_path=None, on_status=None,
+                 incremental=True, state_path=None, hash_sources=False, backend='auto', batching=None,
+                 profile=None, scan_options=None, journal=True, journal_path=None, resume=False,
+                 memory_limit=None, output_root=None, device_limit=None, dedup=None, verify=False,
+                 verify_workers=None, job_timeout=None):
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unsupported archive format: {archive_format}")
+
+        self.archive_format = archive_format
+        self.workers = workers
+        if archive_format == '7z':
+            # An explicit path must point at something runnable
+            seven_zip_path = shutil.which(seven_zip_path) if seven_zip_path else find_seven_zip()
+        self.seven_zip_path = seven_zip_path
+        # For 7z: 'process', 'inprocess' or 'auto' (see backends.create_backend)
+        self.backend = backend
+        # BatchOptions to pack small files into shared archives, or None
+        self.batching = batching
+        # Compression profile name (profiles.PROFILE_CHOICES); None keeps
+        # the format's usual settings
+        self.profile = profile
+        # How manifest folders are expanded and scanned (scanner.ScanOptions)
+        self.scan_options = scan_options or ScanOptions()
+        self.on_status = on_status
+        # Incremental runs keep a state index next to the manifest (or at
+        # state_path) and only recompress items that changed since
+        self.incremental = incremental
+        self.state_path = state_path
+        self.hash_sources = hash_sources
+        # Each run logs its progress to a journal next to the manifest (or
+        # at journal_path); resume continues the run the journal describes
+        self.journal = journal
+        self.journal_path = journal_path
+        self.resume = resume
+        # Bytes running jobs may reserve together; None uses half of the
+        # physical memory, 0 turns the limit off
+        self.memory_limit = default_memory_limit() if memory_limit is None else memory_limit
+        # Archives go below output_root, mirroring the sources' absolute
+        # paths, instead of next to their sources
+        self.output_root = os.path.abspath(output_root) if output_root else None
+        # Jobs that may read from or write to one disk at the same time
+        self.device_limit = device_limit
+        # dedup.DEDUP_MODES to compress identical files once, or None
+        self.dedup = dedup
+        # Test each new archive alongside compression (see CompressionScheduler)
+        self.verify = verify
+        self.verify_workers = verify_workers
+        # Seconds a job may run before it is stopped and fails; None waits
+        self.job_timeout = job_timeout
+        # Scheduler of the run in progress, for cancel() from another thread
+        self.scheduler = None
+        self.cancelled = False
+        # Whether the last run kept a journal it can be resumed from
+        self.resumable = False
+
+    def cancel(self):
+        # Stops the run in progress (callable from any thread); its journal
+        # stays unfinished, so the run can be resumed
+        self.cancelled = True
+        if self.scheduler:
+            self.scheduler.cancel()
+
+    def cancel_item(self, path):
+        if self.scheduler:
+            self.scheduler.cancel_item(path)
+
+    def update_status(self, message):
+        if self.on_status:
+            self.on_status(message)
+
+    def open_state(self, manifest_path):
+        if not self.incremental:
+            return None
+        path = self.state_path
+        if not path and manifest_path and manifest_path != STDIN:
+            path = StateIndex.path_for(manifest_path)
+        if not path:
+            return None
+        try:
+            return StateIndex(path)
+        except (OSError, sqlite3.Error) as e:
+            # A manifest in a read-only folder still gets compressed, only
+            # without skipping unchanged items
+            self.update_status(f"Warning: Cannot use the state index {path} ({e}); every item is checked again")
+            return None
+
+    def open_journal(self, manifest_path):
+        if not self.journal:
+            return None
+        path = self.journal_path
+        if not path and manifest_path and manifest_path != STDIN:
+            path = RunJournal.path_for(manifest_path)
+        if not path:
+            return None
+        try:
+            journal = RunJournal(path, self.archive_format, resume=self.resume, output_root=self.output_root)
+        except OSError as e:
+            self.update_status(f"Warning: Cannot write the run journal {path} ({e}); this run cannot be resumed")
+            return None
+        if self.resume:
+            if journal.entries:
+                cleaned = journal.cleanup_partials()
+                self.update_status(f"Resuming interrupted run; cleaned up after {cleaned} unfinished items")
+            else:
+                self.update_status("No interrupted run to resume, starting from the beginning")
+        return journal
+
+    def create_backend(self):
+        # Raises BackendUnavailable when nothing can write the chosen format
+        return create_backend(self.archive_format, self.seven_zip_path, self.backend)
+
+    def create_scheduler(self, state=None, journal=None):
+        if self.output_root:
+            os.makedirs(self.output_root, exist_ok=True)
+        self.scheduler = CompressionScheduler(
+            self.create_backend(), self.workers, state=state, hash_sources=self.hash_sources,
+            profile=self.profile, journal=journal, memory_limit=self.memory_limit,
+            output_root=self.output_root, device_limit=self.device_limit, dedup=self.dedup,
+            verify=self.verify, verify_workers=self.verify_workers, job_timeout=self.job_timeout
+        )
+        # A cancel() that came in while the manifest was being read
+        if self.cancelled:
+            self.scheduler.cancel()
+        return self.scheduler
+
+    def iter_manifest(self, file_path):
+        # Items as they are discovered, for callers that show them while the
+        # rest of the manifest is still being read and scanned
+        return discover_items(iter_manifest_rows(file_path), self.update_status, self.scan_options)
+
+    def read_manifest(self, file_path):
+        with profiled("manifest-reader"), timed("read-manifest"):
+            return list(self.iter_manifest(file_path))
+
+    def compress(self, items, on_result=None, on_error=None, manifest_path=None, progress=None):
+        self.cancelled = False
+        items = list(Deduplicator(self.dedup is not None, self.update_status).filter(items))
+        if self.batching:
+            items = list(group_small_items(items, self.batching))
+        if progress:
+            for item in items:
+                progress.add_total(item.size)
+            progress.set_total_final()
+        state = self.open_state(manifest_path)
+        journal = self.open_journal(manifest_path)
+        complete = False
+        try:
+            scheduler = self.create_scheduler(state, journal)
+            if journal:
+                for item in items:
+                    journal.queued(item)
+            self.update_status(f"Starting compression of {len(items)} items with {scheduler.workers} workers...")
+            with profiled("scheduler"):
+                summary = scheduler.run(items, on_result=on_result, on_error=on_error, progress=progress)
+            complete = not summary[CANCELLED]
+            return summary
+        finally:
+            self.scheduler = None
+            if journal:
+                journal.close(complete)
+            if state:
+                state.close()
+
+    def run(self, file_path, on_result=None, on_error=None, progress=None):
+        # Reads, validates and compresses in one go; the first archives are
+        # written while the rest of the manifest is still being parsed
+        self.cancelled = False
+        self.resumable = False
+        rows = iter_manifest_rows(file_path)
+        state = self.open_state(file_path)
+        journal = self.open_journal(file_path)
+        self.resumable = journal is not None
+        complete = False
+        try:
+            scheduler = self.create_scheduler(state, journal)
+            self.update_status(f"Starting compression with {scheduler.workers} workers...")
+            summary = run_pipeline(
+                rows, scheduler, self.update_status, on_result, on_error, self.batching, progress,
+                self.scan_options
+            )
+            complete = not summary[CANCELLED]
+            return summary
+        finally:
+            self.scheduler = None
+            if journal:
+                journal.close(complete)
+            if state:
+                state.close()
@@ -0,0 +1,144 @@
+import math
+import os
+import threading
+from collections import Counter
+
+# List of compressed file extensions to skip
+COMPRESSED_EXTENSIONS = {
+    '.zip', '.rar', '.7z', '.tar', '.gz', '.bz2', '.xz', '.iso',
+    '.cab', '.arj', '.lzh', '.lha', '.ace', '.tar.gz', '.tar.bz2',
+    '.tar.xz', '.tgz', '.tbz2', '.txz', '.z', '.zipx', '.war', '.jar',
+    '.ear', '.sar', '.apk', '.ipa', '.msi', '.msp', '.msm', '.mst'
+}
+
+# Formats that are compressed internally: archived, but stored as-is
+DENSE_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.heif', '.avif', '.jxl',
+    '.mp3', '.m4a', '.aac', '.ogg', '.oga', '.opus', '.flac', '.wma',
+    '.mp4', '.m4v', '.mov', '.avi', '.mkv', '.webm', '.wmv', '.flv', '.3gp',
+    '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp', '.epub',
+    '.zst', '.lz4', '.lzma', '.br', '.dmg', '.gpg', '.pgp', '.aes', '.enc',
+}
+
+# (offset, signature) of formats whose content is already compressed
+MAGIC_SIGNATURES = (
+    (0, b'\xff\xd8\xff'),  # JPEG
+    (0, b'\x89PNG\r\n\x1a\n'),  # PNG
+    (0, b'GIF8'),  # GIF
+    (0, b'PK\x03\x04'),  # zip and zip-based documents (docx, odt, jar, ...)
+    (0, b'\x1f\x8b'),  # gzip
+    (0, b'BZh'),  # bzip2
+    (0, b'\xfd7zXZ\x00'),  # xz
+    (0, b"7z\xbc\xaf'\x1c"),  # 7z
+    (0, b'Rar!\x1a\x07'),  # rar
+    (0, b'\x28\xb5\x2f\xfd'),  # zstd
+    (0, b'\x04\x22\x4d\x18'),  # lz4
+    (0, b'MSCF'),  # cab
+    (0, b'\x1a\x45\xdf\xa3'),  # Matroska / WebM
+    (0, b'OggS'),  # Ogg
+    (0, b'fLaC'),  # FLAC
+    (0, b'ID3'),  # MP3 with ID3 tag
+    (4, b'ftyp'),  # MP4 / MOV / HEIC
+    (8, b'WEBP'),  # WebP (RIFF container)
+)
+
+ARCHIVE = 'archive'
+DENSE = 'dense'
+COMPRESSIBLE = 'compressible'
+
+# Bytes read from the start of a file for sniffing and the entropy estimate
+SNIFF_SIZE = 64 * 1024
+# Files this small are not worth sniffing
+MIN_SNIFF_SIZE = 4 * 1024
+# Bits per byte above which a block is treated as incompressible; deflate
+# gains almost nothing on data this close to random
+DENSE_ENTROPY = 7.5
+
+# Verdicts remembered per process; dropped wholesale when full
+CACHE_SIZE = 100000
+
+
+def suffixes(path):
+    # Every dotted suffix of the file name: "a.tar.gz" -> ".tar.gz", ".gz"
+    name = os.path.basename(path).lower()
+    start = name.find('.')
+    while start != -1:
+        yield name[start:]
+        start = name.find('.', start + 1)
+
+
+def is_compressed_file(path):
+    return any(suffix in COMPRESSED_EXTENSIONS for suffix in suffixes(path))
+
+
+def has_dense_extension(path):
+    return any(suffix in DENSE_EXTENSIONS for suffix in suffixes(path))
+
+
+def has_dense_signature(head):
+    return any(head[offset:offset + len(signature)] == signature for offset, signature in MAGIC_SIGNATURES)
+
+
+def byte_entropy(data):
+    if not data:
+        return 0.0
+    total = len(data)
+    return -sum(count / total * math.log2(count / total) for count in Counter(data).values())
+
+
+class Classifier:
+    # Decides whether a file is an archive, already dense, or worth
+    # compressing: extension first (no I/O), then magic bytes and the byte
+    # entropy of its first block. Sniffed verdicts are cached per path and
+    # only reused while the file's size and mtime are unchanged.
+    def __init__(self, cache_size=CACHE_SIZE):
+        self.cache_size = cache_size
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def classify(self, path, size=None, mtime=None):
+        if is_compressed_file(path):
+            return ARCHIVE
+        if has_dense_extension(path):
+            return DENSE
+
+        if size is None or mtime is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return COMPRESSIBLE
+            size, mtime = st.st_size, st.st_mtime
+        if size < MIN_SNIFF_SIZE:
+            return COMPRESSIBLE
+
+        cached = self.cache.get(path)
+        if cached is not None and cached[:2] == (size, mtime):
+            return cached[2]
+
+        verdict = self.sniff(path)
+        with self.lock:
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            self.cache[path] = (size, mtime, verdict)
+        return verdict
+
+    def sniff(self, path):
+        try:
+            with open(path, 'rb') as f:
+                head = f.read(SNIFF_SIZE)
+        except OSError:
+            return COMPRESSIBLE
+        if has_dense_signature(head) or byte_entropy(head) >= DENSE_ENTROPY:
+            return DENSE
+        return COMPRESSIBLE
+
+
+_classifier = Classifier()
+
+
+def classify(path, size=None, mtime=None):
+    return _classifier.classify(path, size, mtime)
+
+
+def is_incompressible(path, size=None, mtime=None):
+    return classify(path, size, mtime) != COMPRESSIBLE
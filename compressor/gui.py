@@ -0,0 +1,408 @@
+import os
+import time
+import tkinter as tk
+from tkinter import filedialog, messagebox, ttk
+import threading
+
+from .backends import BackendUnavailable
+from .engine import CompressionEngine
+from .profiles import PROFILE_CHOICES, default_profile
+from .manifest import UnsupportedFormatError
+from .jobs import CANCELLED, DONE, SKIPPED, archive_path_for
+from .metrics import timed
+from .progress import ProgressReporter, ProgressTracker, format_bytes, format_snapshot
+from .scheduler import default_workers
+from .uichannel import DRAIN_INTERVAL_MS, LOG_LIMIT, UIChannel
+from .virtualtree import VirtualTreeview
+
+# Milliseconds between two looks at the progress snapshots
+PROGRESS_POLL_MS = 200
+# While a manifest loads, discovered items are added to the list in chunks
+# of this many, or at least this often (seconds)
+LOAD_CHUNK = 1000
+LOAD_INTERVAL = 0.2
+
+# (column, heading, width) of the items view
+ITEM_COLUMNS = [
+    ('type', "Type", 60),
+    ('name', "Name", 250),
+    ('size', "Size", 80),
+    ('status', "Status", 90),
+    ('ratio', "Ratio", 60),
+]
+STATUS_LABELS = {DONE: "Compressed", SKIPPED: "Skipped", CANCELLED: "Cancelled"}
+
+
+def play_completion_sound(root):
+    # winsound only exists on Windows; fall back to the Tk bell elsewhere
+    try:
+        import winsound
+    except ImportError:
+        root.bell()
+        return
+    winsound.PlaySound("SystemExclamation", winsound.SND_ALIAS)
+
+
+class FileCompressor:
+    def __init__(self, root, archive_format='zip'):
+        self.root = root
+        self.archive_format = archive_format
+        self.root.title("File Compressor (7-Zip)" if archive_format == '7z' else "File Compressor")
+        self.root.geometry("600x560")
+        
+        # Worker threads talk to the widgets only through this channel
+        self.channel = UIChannel()
+        
+        self.engine = CompressionEngine(archive_format, on_status=self.update_status)
+        
+        # Create main frame
+        self.main_frame = tk.Frame(self.root, padx=20, pady=20)
+        self.main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # Create file input frame
+        self.file_frame = tk.Frame(self.main_frame)
+        self.file_frame.pack(fill=tk.X, pady=10)
+        
+        self.file_label = tk.Label(self.file_frame, text="Select Manifest File:")
+        self.file_label.pack(side=tk.LEFT)
+        
+        self.file_var = tk.StringVar()
+        self.file_entry = tk.Entry(self.file_frame, textvariable=self.file_var, width=50)
+        self.file_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        
+        self.browse_button = tk.Button(self.file_frame, text="Browse", command=self.browse_file)
+        self.browse_button.pack(side=tk.LEFT)
+        
+        # Items to compress; only the rows on screen exist as widgets
+        self.items_view = VirtualTreeview(self.main_frame, ITEM_COLUMNS, self.format_item_row)
+        self.items_view.pack(fill=tk.BOTH, expand=True, pady=10)
+        
+        # Create buttons frame
+        self.buttons_frame = tk.Frame(self.main_frame)
+        self.buttons_frame.pack(fill=tk.X, pady=10)
+        
+        # Compress button
+        self.compress_button = tk.Button(self.buttons_frame, text="Compress Files/Folders", command=self.start_compression)
+        self.compress_button.pack(side=tk.LEFT, padx=5)
+        
+        # Stops the running jobs; the run can be resumed later
+        self.stop_button = tk.Button(self.buttons_frame, text="Stop", command=self.stop_compression, state=tk.DISABLED)
+        self.stop_button.pack(side=tk.LEFT, padx=5)
+        
+        # Number of items compressed at the same time
+        self.workers_label = tk.Label(self.buttons_frame, text="Workers:")
+        self.workers_label.pack(side=tk.LEFT, padx=(15, 0))
+        
+        self.workers_var = tk.IntVar(value=default_workers(archive_format))
+        self.workers_spinbox = tk.Spinbox(self.buttons_frame, from_=1, to=64, width=4, textvariable=self.workers_var)
+        self.workers_spinbox.pack(side=tk.LEFT, padx=5)
+        
+        # Compression profile; auto picks one per item from a test compression
+        self.profile_label = tk.Label(self.buttons_frame, text="Profile:")
+        self.profile_label.pack(side=tk.LEFT, padx=(15, 0))
+        
+        self.profile_var = tk.StringVar(value=default_profile(archive_format))
+        self.profile_combobox = ttk.Combobox(self.buttons_frame, textvariable=self.profile_var,
+                                             values=PROFILE_CHOICES, state="readonly", width=9)
+        self.profile_combobox.pack(side=tk.LEFT, padx=5)
+        
+        # Continue the run recorded in the journal instead of starting over
+        self.resume_var = tk.BooleanVar(value=False)
+        self.resume_check = tk.Checkbutton(self.buttons_frame, text="Resume", variable=self.resume_var)
+        self.resume_check.pack(side=tk.LEFT, padx=(15, 0))
+        
+        # Read every archive back while the next items are compressed
+        self.verify_var = tk.BooleanVar(value=False)
+        self.verify_check = tk.Checkbutton(self.buttons_frame, text="Verify", variable=self.verify_var)
+        self.verify_check.pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Progress bar
+        self.progress_frame = tk.Frame(self.main_frame)
+        self.progress_frame.pack(fill=tk.X, pady=10)
+        
+        self.progress_label = tk.Label(self.progress_frame, text="Progress:")
+        self.progress_label.pack(side=tk.LEFT)
+        
+        self.progress_var = tk.DoubleVar()
+        self.progress_bar = ttk.Progressbar(self.progress_frame, variable=self.progress_var, maximum=100)
+        self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
+        # Throughput, ETA and what each worker is doing
+        self.throughput_label = tk.Label(self.main_frame, text="", anchor=tk.W, justify=tk.LEFT)
+        self.throughput_label.pack(fill=tk.X)
+        
+        # Status label
+        self.status_label = tk.Label(self.main_frame, text="", wraplength=550)
+        self.status_label.pack(fill=tk.X, pady=10)
+        
+        # Per-file messages
+        self.log_frame = tk.Frame(self.main_frame)
+        self.log_frame.pack(fill=tk.BOTH, expand=True)
+        
+        self.log_text = tk.Text(self.log_frame, height=8, state=tk.DISABLED, wrap=tk.NONE)
+        self.log_scrollbar = tk.Scrollbar(self.log_frame, command=self.log_text.yview)
+        self.log_text.config(yscrollcommand=self.log_scrollbar.set)
+        self.log_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        self.is_compressing = False
+        self.is_loading = False
+        self.items_to_compress = []
+        # Per-row status and ratio, indexed like items_to_compress
+        self.item_status = []
+        self.item_ratio = []
+        self.item_rows = {}
+        
+        # Check if 7-Zip (or py7zr) is installed
+        self.backend_error = self.check_backend()
+        if self.backend_error:
+            messagebox.showerror("Error", self.backend_error)
+            self.compress_button.config(state=tk.DISABLED)
+        
+        self.root.after(DRAIN_INTERVAL_MS, self.drain_channel)
+
+    def check_backend(self):
+        try:
+            self.engine.create_backend()
+        except BackendUnavailable as e:
+            return str(e)
+        return None
+
+    def browse_file(self):
+        file_path = filedialog.askopenfilename(
+            title="Select Manifest File",
+            filetypes=[
+                ("Excel files", "*.xlsx;*.xls"),
+                ("OpenOffice files", "*.ods"),
+                ("CSV/TSV files", "*.csv;*.tsv"),
+                ("Text files", "*.txt;*.lst"),
+                ("All files", "*.*")
+            ]
+        )
+        if file_path:
+            self.file_var.set(file_path)
+            self.read_file(file_path)
+
+    def read_file(self, file_path):
+        if self.is_loading or self.is_compressing:
+            return
+        self.items_to_compress = []
+        self.update_items_list()
+        
+        # Reading and scanning run off the main loop so the window stays
+        # responsive; rows appear as the items are found
+        self.is_loading = True
+        self.browse_button.config(state=tk.DISABLED)
+        self.compress_button.config(state=tk.DISABLED)
+        threading.Thread(target=self.load_items, args=(file_path,), daemon=True).start()
+
+    def load_items(self, file_path):
+        chunk = []
+        last_post = time.monotonic()
+        failed = False
+        try:
+            for item in self.engine.iter_manifest(file_path):
+                chunk.append(item)
+                if len(chunk) >= LOAD_CHUNK or time.monotonic() - last_post >= LOAD_INTERVAL:
+                    self.channel.call(self.add_items, chunk)
+                    chunk = []
+                    last_post = time.monotonic()
+            self.channel.call(self.add_items, chunk)
+        except UnsupportedFormatError:
+            self.channel.post_error("Unsupported file format")
+            failed = True
+        except Exception as e:
+            self.channel.post_error(f"Failed to read file: {str(e)}")
+            failed = True
+        
+        self.channel.call(self.finish_loading, failed)
+
+    def add_items(self, items):
+        first_row = len(self.items_to_compress)
+        self.items_to_compress.extend(items)
+        self.item_status.extend(["Queued"] * len(items))
+        self.item_ratio.extend([None] * len(items))
+        for row, item in enumerate(items, first_row):
+            self.item_rows[item.path] = row
+        self.items_view.add_rows(len(items))
+
+    def finish_loading(self, failed):
+        self.is_loading = False
+        self.browse_button.config(state=tk.NORMAL)
+        if not self.backend_error:
+            self.compress_button.config(state=tk.NORMAL)
+        if failed:
+            self.items_to_compress = []
+            self.update_items_list()
+        elif not self.items_to_compress:
+            messagebox.showwarning("Warning", "No valid file paths found in the selected file")
+
+    def update_items_list(self):
+        count = len(self.items_to_compress)
+        self.item_status = ["Queued"] * count
+        self.item_ratio = [None] * count
+        self.item_rows = {item.path: row for row, item in enumerate(self.items_to_compress)}
+        self.items_view.set_row_count(count)
+
+    def format_item_row(self, row):
+        item = self.items_to_compress[row]
+        ratio = self.item_ratio[row]
+        return (
+            "Folder" if item.is_dir else "File",
+            item.name,
+            format_bytes(item.size),
+            self.item_status[row],
+            "" if ratio is None else f"{ratio:.0%}",
+        )
+
+    def set_item_result(self, item, status, ratio=None):
+        # A batch result stands for each of its member rows
+        for member in getattr(item, 'members', (item,)):
+            row = self.item_rows.get(member.path)
+            if row is not None:
+                self.item_status[row] = status
+                self.item_ratio[row] = ratio
+        self.items_view.invalidate()
+
+    def archive_ratio(self, item):
+        try:
+            archive_path = archive_path_for(item, self.archive_format, self.engine.output_root)
+            archive_size = os.path.getsize(archive_path)
+        except OSError:
+            return None
+        return archive_size / item.size if item.size else None
+
+    def start_compression(self):
+        if not self.items_to_compress:
+            messagebox.showwarning("Warning", "Please select a file with paths first")
+            return
+            
+        if self.is_compressing:
+            return
+            
+        if self.backend_error:
+            messagebox.showerror("Error", self.backend_error)
+            return
+            
+        self.is_compressing = True
+        self.compress_button.config(state=tk.DISABLED)
+        self.stop_button.config(state=tk.NORMAL)
+        self.progress_var.set(0)
+        self.update_items_list()
+        
+        self.progress = ProgressTracker()
+        self.progress_reporter = ProgressReporter(self.progress).start()
+        self.poll_progress()
+        
+        # Start compression in a separate thread
+        threading.Thread(target=self.compress_items, daemon=True).start()
+
+    def stop_compression(self):
+        # engine.cancel() only signals; the jobs wind down in the background
+        # and finish_compression runs once they have
+        self.stop_button.config(state=tk.DISABLED)
+        self.update_status("Stopping...")
+        self.engine.cancel()
+
+    def poll_progress(self):
+        # Runs on the Tk main loop; reads the latest throttled snapshot
+        snapshot = self.progress_reporter.latest()
+        if snapshot is not None:
+            self.show_progress(snapshot)
+        if self.is_compressing:
+            self.root.after(PROGRESS_POLL_MS, self.poll_progress)
+
+    def show_progress(self, snapshot):
+        if snapshot.total_bytes:
+            self.progress_var.set(snapshot.done_bytes / snapshot.total_bytes * 100)
+        lines = [f"{format_snapshot(snapshot)}, {snapshot.items_done}/{snapshot.items_total} items"]
+        for number, name, fraction in snapshot.workers:
+            lines.append(f"Worker {number}: {name} ({fraction:.0%})")
+        self.throughput_label.config(text="\n".join(lines))
+
+    def get_workers(self):
+        try:
+            return max(1, int(self.workers_var.get()))
+        except (tk.TclError, ValueError):
+            return None
+
+    def compress_items(self):
+        self.engine.workers = self.get_workers()
+        self.engine.profile = self.profile_var.get()
+        self.engine.resume = self.resume_var.get()
+        self.engine.verify = self.verify_var.get()
+        
+        try:
+            self.engine.compress(
+                self.items_to_compress, on_result=self.on_item_result, on_error=self.on_item_error,
+                manifest_path=self.file_var.get(), progress=self.progress
+            )
+        except Exception as e:
+            self.channel.post_error(f"Compression failed: {str(e)}")
+        
+        self.progress_reporter.stop()
+        self.channel.call(self.finish_compression)
+
+    def finish_compression(self):
+        # Play completion sound
+        play_completion_sound(self.root)
+        
+        # Reset UI state
+        self.is_compressing = False
+        self.compress_button.config(state=tk.NORMAL)
+        self.stop_button.config(state=tk.DISABLED)
+        if self.engine.cancelled:
+            self.update_status("Stopped; check Resume to continue where it left off")
+            return
+        self.progress_var.set(100)
+        self.update_status("All items have been processed!")
+
+    def on_item_result(self, item, status, message):
+        # Per-file messages go to the log only; the label would flicker
+        self.channel.log(message)
+        ratio = self.archive_ratio(item) if status == DONE else None
+        self.channel.call(self.set_item_result, item, STATUS_LABELS.get(status, status), ratio)
+
+    def on_item_error(self, item, error):
+        self.channel.post_error(f"Failed to compress {item.name}: {str(error)}")
+        self.channel.call(self.set_item_result, item, "Failed")
+
+    def update_status(self, message):
+        # Safe from any thread; shown at the next drain
+        self.channel.post_status(message)
+
+    def drain_channel(self):
+        with timed('gui-update'):
+            status, lines, errors, calls = self.channel.drain()
+            if status is not None:
+                self.status_label.config(text=status)
+            if lines:
+                self.append_log(lines)
+            if errors:
+                self.show_errors(errors)
+            for function, args in calls:
+                function(*args)
+        self.root.after(DRAIN_INTERVAL_MS, self.drain_channel)
+
+    def append_log(self, lines):
+        self.log_text.config(state=tk.NORMAL)
+        self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+        excess = int(self.log_text.index("end-1c").split(".")[0]) - 1 - LOG_LIMIT
+        if excess > 0:
+            self.log_text.delete("1.0", f"{excess + 1}.0")
+        self.log_text.config(state=tk.DISABLED)
+        self.log_text.see(tk.END)
+
+    def show_errors(self, errors):
+        # One dialog per drain, however many items failed in the meantime
+        if len(errors) == 1:
+            messagebox.showerror("Error", errors[0])
+        else:
+            messagebox.showerror("Error", f"{len(errors)} errors, see the log for details:\n" + "\n".join(errors[:5]))
+
+
+def run_gui(archive_format='zip'):
+    root = tk.Tk()
+    app = FileCompressor(root, archive_format)
+    root.mainloop()
+    return app
@@ -0,0 +1,85 @@
+import os
+import stat
+from collections import namedtuple
+
+FILE = 'file'
+DIR = 'dir'
+BATCH = 'batch'
+DUPLICATE = 'duplicate'
+
+
+class Item(namedtuple('Item', ['path', 'kind', 'size', 'mtime', 'dev', 'contents'], defaults=[None])):
+    # One entry to compress, carrying the stat result taken when it was
+    # discovered so later stages never have to stat it again. Folders also
+    # carry their scanner.ScanRecords in contents; size and mtime are then
+    # the folder's total size and newest mtime.
+    __slots__ = ()
+
+    @classmethod
+    def from_stat(cls, path, st):
+        if stat.S_ISDIR(st.st_mode):
+            return cls(path, DIR, 0, st.st_mtime, st.st_dev)
+        return cls(path, FILE, st.st_size, st.st_mtime, st.st_dev)
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+    @property
+    def is_dir(self):
+        return self.kind == DIR
+
+
+class Batch(namedtuple('Batch', ['path', 'members'])):
+    # Several small file Items packed into one archive; path is the archive
+    # path without its extension. Quacks like an Item for the scheduler.
+    __slots__ = ()
+    kind = BATCH
+    is_dir = False
+    contents = None
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+    @property
+    def size(self):
+        return sum(member.size for member in self.members)
+
+    @property
+    def mtime(self):
+        return max(member.mtime for member in self.members)
+
+    @property
+    def dev(self):
+        return self.members[0].dev
+
+
+class Duplicate(namedtuple('Duplicate', ['item', 'original'])):
+    # A file byte-identical to an earlier file (original), so it is not
+    # compressed again but recorded against the original's archive.
+    # Quacks like its item for the scheduler.
+    __slots__ = ()
+    kind = DUPLICATE
+    is_dir = False
+    contents = None
+
+    @property
+    def path(self):
+        return self.item.path
+
+    @property
+    def name(self):
+        return self.item.name
+
+    @property
+    def size(self):
+        return self.item.size
+
+    @property
+    def mtime(self):
+        return self.item.mtime
+
+    @property
+    def dev(self):
+        return self.item.dev
@@ -0,0 +1,157 @@
+import os
+from collections import namedtuple
+
+from .batching import INDEX_SUFFIX, write_batch_index
+from .checksums import file_checksum
+from .filetypes import is_compressed_file
+from .items import BATCH, FILE
+from .metrics import count, timed
+from .profiles import default_profile
+from .progress import report_start
+from .state import StateRecord
+
+SKIPPED = 'skipped'
+DONE = 'done'
+# Stopped on request before it finished; nothing is left behind
+CANCELLED = 'cancelled'
+
+# Archives are written under this suffix and renamed into place once
+# complete, so an interrupted run never leaves a truncated archive behind
+# under the final name
+TEMP_SUFFIX = '.tmp'
+
+class ArchiveConflict(Exception):
+    # Two sources map to one archive name (x.txt and x.log -> x.zip)
+    pass
+
+
+# incremental: decide from the state index record instead of from whether
+# the archive exists. hash_sources: also store a content hash of each source
+# file, so a file whose mtime changed but whose bytes did not is not redone.
+# profile: compression profile name, None for the format's default.
+# checksum_archives: return a record with the archive checksum even when
+# not running incrementally (the run journal stores it).
+# output_root: folder the archives are written under instead of next to
+# their sources (see archive_path_for).
+JobOptions = namedtuple('JobOptions', ['incremental', 'hash_sources', 'profile', 'checksum_archives', 'output_root'],
+                        defaults=[False, False, None, False, None])
+
+# What a job did; record is the new state index entry when an archive was
+# written or an unchanged source was re-validated
+JobResult = namedtuple('JobResult', ['status', 'message', 'record'], defaults=[None])
+
+
+def mirrored_path(path, output_root):
+    # path's absolute location re-created below output_root, with the drive
+    # or UNC share as the first folders: C:\data\a -> <root>\C\data\a,
+    # \\server\share\a -> <root>\server\share\a, /data/a -> <root>/data/a
+    drive, rest = os.path.splitdrive(os.path.abspath(path))
+    drive_parts = [part for part in drive.replace(':', '').replace('\\', '/').split('/') if part]
+    return os.path.join(output_root, *drive_parts, rest.lstrip('\\/'))
+
+
+def archive_path_for(item, extension, output_root=None):
+    if item.is_dir or item.kind == BATCH:
+        base = item.path
+    else:
+        base = os.path.join(os.path.dirname(item.path), os.path.splitext(item.name)[0])
+    if output_root:
+        base = mirrored_path(base, output_root)
+    return f"{base}.{extension}"
+
+
+def partial_outputs(archive_path):
+    # Files a job writes before its archive is complete: the archive itself
+    # under TEMP_SUFFIX, the list file 7-Zip reads for batches and the
+    # batch index before its rename
+    temp_path = archive_path + TEMP_SUFFIX
+    return [temp_path, temp_path + '.list', archive_path + INDEX_SUFFIX + TEMP_SUFFIX]
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def describe(item):
+    if item.is_dir:
+        return "folder"
+    if item.kind == BATCH:
+        return f"batch of {len(item.members)} files"
+    return "file"
+
+
+def check_unchanged(item, record, archive_path, size, mtime, options):
+    # Returns the record to keep if the archive is still up to date, else None
+    if record is None or record.archive_path != archive_path or record.source_size != size:
+        return None
+    try:
+        if os.path.getsize(archive_path) != record.archive_size:
+            return None
+    except OSError:
+        return None
+    if record.source_mtime == mtime:
+        return record
+    # Touched but possibly not modified: the content hash settles it
+    if options.hash_sources and record.source_hash and item.kind == FILE:
+        if file_checksum(item.path) == record.source_hash:
+            return record._replace(source_mtime=mtime)
+    return None
+
+
+def run_job(item, backend, options=JobOptions(), record=None):
+    # Runs in a worker thread, so it reports back through its return value
+    # instead of touching the GUI
+    name = item.name
+    kind = describe(item)
+    report_start(item.path, name, item.size)
+
+    # Skip if it's a compressed file
+    if item.kind == FILE and is_compressed_file(item.path):
+        count('skipped', reason='already-compressed')
+        return JobResult(SKIPPED, f"Skipping already compressed item: {name}")
+
+    archive_path = archive_path_for(item, backend.extension, options.output_root)
+    if options.incremental:
+        # Discovery already measured folders (total size, newest mtime)
+        size, mtime = item.size, item.mtime
+        unchanged = check_unchanged(item, record, archive_path, size, mtime, options)
+        if unchanged is not None:
+            count('skipped', reason='unchanged')
+            return JobResult(SKIPPED, f"Skipping unchanged {kind}: {name}", unchanged)
+    elif os.path.exists(archive_path):
+        count('skipped', reason='archive-exists')
+        return JobResult(SKIPPED, f"Skipping already compressed {kind}: {name}")
+
+    if options.output_root:
+        os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+
+    # A leftover from an interrupted run would otherwise be appended to
+    temp_path = archive_path + TEMP_SUFFIX
+    remove_file(temp_path)
+    try:
+        with timed('compress'):
+            backend.write(item, temp_path, options.profile or default_profile(backend.extension))
+        os.replace(temp_path, archive_path)
+    except BaseException:
+        remove_file(temp_path)
+        raise
+    if item.kind == BATCH:
+        write_batch_index(item, archive_path)
+    archive_size = os.path.getsize(archive_path)
+    count('bytes_read', backend.input_size(item))
+    count('bytes_written', archive_size)
+
+    new_record = None
+    if options.incremental or options.checksum_archives:
+        with timed('checksum'):
+            source_hash = None
+            if options.hash_sources and item.kind == FILE:
+                source_hash = file_checksum(item.path)
+            archive_checksum = file_checksum(archive_path)
+        new_record = StateRecord(
+            item.path, item.size, item.mtime, source_hash, archive_path, archive_size, archive_checksum
+        )
+    return JobResult(DONE, f"Successfully compressed {kind}: {name}", new_record)
@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+from .jobs import archive_path_for, partial_outputs, remove_file
+
+JOURNAL_SUFFIX = '.journal.jsonl'
+
+QUEUED = 'queued'
+IN_PROGRESS = 'in-progress'
+FINISHED = 'done'
+FAILED = 'failed'
+
+# Lines are flushed to the OS as they are written, which survives the
+# application crashing; fsync only every so often to also survive most of
+# a power cut without slowing small items down
+SYNC_EVERY = 200
+
+# Last known state of one item; archive fields are None when no archive
+# was written (already compressed files, legacy skips)
+JournalEntry = namedtuple('JournalEntry', ['state', 'archive_path', 'archive_size', 'archive_checksum'])
+
+
+def load_journal(path):
+    # {source path: JournalEntry} from the events in a journal file; a line
+    # cut short by a crash is ignored
+    entries = {}
+    try:
+        f = open(path, encoding='utf-8')
+    except FileNotFoundError:
+        return entries
+    with f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            source_path = event.get('path')
+            if source_path is None:
+                continue
+            entries[source_path] = JournalEntry(
+                event['state'], event.get('archive'), event.get('size'), event.get('checksum')
+            )
+    return entries
+
+
+class RunJournal:
+    # Append-only JSON lines log of one run: every item is queued when it is
+    # discovered, in-progress once handed to a worker, and done or failed
+    # when its job returns. After a crash, resume=True reloads the log:
+    # partial outputs of items that were in progress are removed and items
+    # that finished (with their archive still in place) are not redone.
+    def __init__(self, path, extension, resume=False, output_root=None):
+        self.path = path
+        self.extension = extension
+        self.output_root = output_root
+        self.entries = load_journal(path) if resume else {}
+        self.lock = threading.Lock()
+        self.unsynced = 0
+        self.file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        self._write({'event': 'run', 'resumed': resume, 'extension': extension, 'time': time.time()})
+
+    @staticmethod
+    def path_for(manifest_path):
+        return f"{manifest_path}{JOURNAL_SUFFIX}"
+
+    def cleanup_partials(self):
+        # Removes what interrupted jobs left behind; returns how many items
+        # were affected
+        count = 0
+        for source_path, entry in self.entries.items():
+            if entry.state == IN_PROGRESS and entry.archive_path:
+                for path in partial_outputs(entry.archive_path):
+                    remove_file(path)
+                count += 1
+        return count
+
+    def completed(self, item):
+        # The entry of an item the interrupted run already finished, or None
+        entry = self.entries.get(item.path)
+        if entry is None or entry.state != FINISHED:
+            return None
+        if entry.archive_path is None:
+            return entry
+        if entry.archive_path != archive_path_for(item, self.extension, self.output_root):
+            return None
+        try:
+            if os.path.getsize(entry.archive_path) != entry.archive_size:
+                return None
+        except OSError:
+            return None
+        return entry
+
+    def queued(self, item):
+        self._write({'path': item.path, 'state': QUEUED})
+
+    def started(self, item):
+        archive_path = archive_path_for(item, self.extension, self.output_root)
+        self._write({'path': item.path, 'state': IN_PROGRESS, 'archive': archive_path})
+
+    def finished(self, item, record=None):
+        event = {'path': item.path, 'state': FINISHED}
+        if record:
+            event.update(archive=record.archive_path, size=record.archive_size, checksum=record.archive_checksum)
+        self._write(event)
+
+    def carried_over(self, item, entry):
+        # An item the interrupted run finished is queued again by this one;
+        # logged as done once more so a later resume still skips it
+        event = {'path': item.path, 'state': FINISHED}
+        if entry.archive_path:
+            event.update(archive=entry.archive_path, size=entry.archive_size, checksum=entry.archive_checksum)
+        self._write(event)
+
+    def failed(self, item, error):
+        self._write({'path': item.path, 'state': FAILED, 'error': str(error)})
+
+    def _write(self, event):
+        line = json.dumps(event, ensure_ascii=False) + '\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            self.unsynced += 1
+            if self.unsynced >= SYNC_EVERY:
+                os.fsync(self.file.fileno())
+                self.unsynced = 0
+
+    def close(self, complete=False):
+        if complete:
+            self._write({'event': 'finished', 'time': time.time()})
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(complete=exc_type is None)
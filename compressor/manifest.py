@@ -0,0 +1,284 @@
+import csv
+import io
+import locale
+import os
+import sys
+import zipfile
+
+TABLE_NS = "urn:oasis:names:tc:opendocument:xmlns:table:1.0"
+TEXT_NS = "urn:oasis:names:tc:opendocument:xmlns:text:1.0"
+
+TABLE = f"{{{TABLE_NS}}}table"
+TABLE_ROW = f"{{{TABLE_NS}}}table-row"
+TABLE_CELLS = (f"{{{TABLE_NS}}}table-cell", f"{{{TABLE_NS}}}covered-table-cell")
+TEXT_P = f"{{{TEXT_NS}}}p"
+TEXT_S = f"{{{TEXT_NS}}}s"
+TEXT_TAB = f"{{{TEXT_NS}}}tab"
+TEXT_SPACE_COUNT = f"{{{TEXT_NS}}}c"
+
+# Manifest path that means "read the paths from standard input"
+STDIN = '-'
+
+XLSX = 'xlsx'
+XLS = 'xls'
+ODS = 'ods'
+CSV = 'csv'
+PATH_LIST = 'list'
+NUL_LIST = 'list0'
+
+ZIP_MAGIC = b'PK\x03\x04'
+# Compound document header of legacy .xls workbooks
+OLE2_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+ODS_MIMETYPE = b'application/vnd.oasis.opendocument.spreadsheet'
+
+# Bytes looked at to tell the formats apart
+SNIFF_SIZE = 64 * 1024
+CSV_DELIMITERS = ',;\t'
+# A one-column CSV looks just like a list of paths; the extension settles it
+CSV_EXTENSIONS = ('.csv', '.tsv')
+
+
+class UnsupportedFormatError(ValueError):
+    pass
+
+
+class ManifestReadError(Exception):
+    # The manifest could not be opened or parsed; raised in place of the
+    # underlying error so callers can tell it apart from a failing run
+    pass
+
+
+def iter_manifest_rows(file_path):
+    # The format is detected from the content, not the extension. Checked up
+    # front so an unsupported file fails immediately rather than on the
+    # first next() of the returned generator.
+    try:
+        rows = open_manifest_rows(file_path)
+    except UnsupportedFormatError:
+        raise
+    except Exception as e:
+        raise ManifestReadError(str(e)) from e
+    return _checked_rows(rows)
+
+
+def _checked_rows(rows):
+    try:
+        yield from rows
+    except UnsupportedFormatError:
+        raise
+    except Exception as e:
+        raise ManifestReadError(str(e)) from e
+
+
+def open_manifest_rows(file_path):
+    if file_path == STDIN:
+        stream = sys.stdin.buffer
+        manifest_format, dialect = detect_text_format(stream.peek(SNIFF_SIZE)[:SNIFF_SIZE])
+        return read_text_rows(stream, manifest_format, dialect, close=False)
+
+    with open(file_path, 'rb') as f:
+        head = f.read(SNIFF_SIZE)
+    if head.startswith(ZIP_MAGIC):
+        manifest_format = detect_zip_format(file_path)
+    elif head.startswith(OLE2_MAGIC):
+        manifest_format = XLS
+    else:
+        named_csv = file_path.lower().endswith(CSV_EXTENSIONS)
+        manifest_format, dialect = detect_text_format(head, named_csv)
+        if manifest_format == PATH_LIST and named_csv:
+            manifest_format, dialect = CSV, csv.excel
+
+    if manifest_format == XLSX:
+        return read_excel_rows(file_path)
+    if manifest_format == ODS:
+        return read_ods_rows(file_path)
+    if manifest_format == XLS:
+        return read_xls_rows(file_path)
+    return read_text_rows(open(file_path, 'rb'), manifest_format, dialect)
+
+
+def detect_zip_format(file_path):
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            names = set(archive.namelist())
+            if 'xl/workbook.xml' in names:
+                return XLSX
+            if 'content.xml' in names and ('mimetype' not in names or
+                                           archive.read('mimetype').strip() == ODS_MIMETYPE):
+                return ODS
+    except zipfile.BadZipFile:
+        pass
+    raise UnsupportedFormatError("Unsupported file format")
+
+
+def text_encoding(head):
+    # UTF-8 (with or without BOM) when the sample decodes as such, otherwise
+    # the system code page, which is what Excel uses for "CSV" exports
+    try:
+        head.decode('utf-8')
+        return 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # The sample may end in the middle of a character
+        if e.start >= len(head) - 3:
+            return 'utf-8-sig'
+        return locale.getpreferredencoding(False)
+
+
+def looks_like_path(line):
+    # Column titles have no folder separators; paths nearly always do
+    line = line.strip()
+    return '/' in line or '\\' in line or line.startswith('~') or os.path.exists(line)
+
+
+def detect_text_format(head, named_csv=False):
+    # Returns (format, csv dialect or None). NUL separators come from
+    # find -print0. CSV/TSV needs the same delimiter count on every sampled
+    # line and, unless the file is named .csv/.tsv, a header row that is
+    # not itself a path: paths below "/srv/Acme, Inc/" share a comma count
+    # too. Anything else is one path per line.
+    if not head.strip():
+        return PATH_LIST, None
+    if b'\0' in head:
+        if b'\0' in head[:2] and head[:2] in (b'\xff\xfe', b'\xfe\xff'):
+            raise UnsupportedFormatError("UTF-16 text manifests are not supported, save them as UTF-8")
+        return NUL_LIST, None
+    if any(byte < 9 for byte in head[:1024]):
+        raise UnsupportedFormatError("Unsupported file format")
+
+    text = head.decode(text_encoding(head), errors='replace')
+    lines = text.splitlines()
+    if len(head) == SNIFF_SIZE and len(lines) > 1:
+        lines = lines[:-1]  # Probably cut short
+    try:
+        dialect = csv.Sniffer().sniff("\n".join(lines[:100]), delimiters=CSV_DELIMITERS)
+    except csv.Error:
+        return PATH_LIST, None
+    counts = {line.count(dialect.delimiter) for line in lines[:100] if line}
+    if len(lines) > 1 and len(counts) == 1 and counts != {0} and (named_csv or not looks_like_path(lines[0])):
+        return CSV, dialect
+    return PATH_LIST, None
+
+
+def read_text_rows(stream, manifest_format, dialect=None, close=True):
+    # CSV/TSV keep the spreadsheet convention: first column, first row is a
+    # header. Path lists have no header; blank lines are ignored.
+    try:
+        if manifest_format == NUL_LIST:
+            # No decoding beyond what the OS would do with the raw names
+            buffered = b''
+            for block in iter(lambda: stream.read(SNIFF_SIZE), b''):
+                buffered += block
+                *paths, buffered = buffered.split(b'\0')
+                for path in paths:
+                    if path:
+                        yield path.decode(sys.getfilesystemencoding(), 'surrogateescape')
+            if buffered:
+                yield buffered.decode(sys.getfilesystemencoding(), 'surrogateescape')
+            return
+
+        head = stream.peek(SNIFF_SIZE)[:SNIFF_SIZE] if hasattr(stream, 'peek') else b''
+        text = io.TextIOWrapper(stream, encoding=text_encoding(head), errors='surrogateescape', newline='')
+        if manifest_format == CSV:
+            reader = csv.reader(text, dialect)
+            next(reader, None)  # Skip header row
+            for row in reader:
+                if row and row[0].strip():
+                    yield row[0].strip()
+            return
+
+        for line in text:
+            path = line.rstrip('\r\n')
+            if path.strip():
+                yield path.strip()
+    finally:
+        if close:
+            stream.close()
+
+
+def read_excel_rows(file_path):
+    # Imported here so the CLI and the zip GUI start without openpyxl
+    import openpyxl
+
+    # Read-only mode parses the sheet XML as rows are requested instead of
+    # building every cell up front
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+
+        # Read paths from second row onwards
+        for row in sheet.iter_rows(min_row=2, max_col=1, values_only=True):
+            if row and row[0]:  # Check if first column has a value
+                yield str(row[0]).strip()
+    finally:
+        workbook.close()
+
+
+def cell_text(cell):
+    text = []
+    for p in cell.iter(TEXT_P):
+        for node in p.iter():
+            if node is not p:
+                if node.tag == TEXT_S:
+                    text.append(" " * int(node.get(TEXT_SPACE_COUNT, 1)))
+                elif node.tag == TEXT_TAB:
+                    text.append("\t")
+            if node.text and node.tag not in (TEXT_S, TEXT_TAB):
+                text.append(node.text)
+            if node is not p and node.tail:
+                text.append(node.tail)
+    return "".join(text)
+
+
+def read_xls_rows(file_path):
+    # Legacy binary workbooks; openpyxl cannot read them, xlrd can
+    try:
+        import xlrd
+    except ImportError:
+        raise UnsupportedFormatError(
+            "Reading .xls files needs xlrd (pip install xlrd); or save the file as .xlsx or .csv"
+        )
+
+    workbook = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        sheet = workbook.sheet_by_index(0)
+        # Read paths from second row onwards
+        for row in range(1, sheet.nrows):
+            value = sheet.cell_value(row, 0)
+            if value:
+                yield str(value).strip()
+    finally:
+        workbook.release_resources()
+
+
+def read_ods_rows(file_path):
+    # An .ods file is a zip with the sheets in content.xml; walk it with
+    # iterparse and drop every row once read, so memory stays flat no matter
+    # how many rows there are
+    import xml.etree.ElementTree as ET
+
+    with zipfile.ZipFile(file_path) as ods, ods.open("content.xml") as content:
+        parents = []
+        tables_seen = 0
+        rows_seen = 0
+        for event, elem in ET.iterparse(content, events=("start", "end")):
+            if event == "start":
+                if elem.tag == TABLE:
+                    tables_seen += 1
+                parents.append(elem)
+                continue
+
+            parents.pop()
+            if elem.tag == TABLE:
+                # Only the first sheet is read
+                return
+            if elem.tag != TABLE_ROW or tables_seen != 1:
+                continue
+
+            rows_seen += 1
+            if rows_seen > 1:  # Skip header row
+                cell = next((child for child in elem if child.tag in TABLE_CELLS), None)
+                if cell is not None:
+                    yield cell_text(cell).strip()
+
+            if parents:
+                parents[-1].remove(elem)
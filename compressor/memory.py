@@ -0,0 +1,71 @@
+import ctypes
+import os
+
+MB = 1024 * 1024
+
+# Share of physical memory the scheduler lets running jobs reserve when no
+# explicit limit is given
+DEFAULT_SHARE = 0.5
+
+# LZMA's match finder needs about this many times the dictionary size
+# while compressing (bt4, as used from -mx=5 on)
+LZMA_MEMORY_FACTOR = 11.5
+# Buffers, process and library overhead counted once per job
+JOB_OVERHEAD = 16 * MB
+
+
+def physical_memory():
+    # Total RAM in bytes, or None when it cannot be found out
+    if hasattr(os, 'sysconf'):
+        try:
+            return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+        except (ValueError, OSError):
+            return None
+    if os.name == 'nt':
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [
+                ('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                ('ullAvailExtendedVirtual', ctypes.c_ulonglong),
+            ]
+        status = MemoryStatus()
+        status.dwLength = ctypes.sizeof(MemoryStatus)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullTotalPhys
+    return None
+
+
+def default_memory_limit():
+    total = physical_memory()
+    return int(total * DEFAULT_SHARE) if total else None
+
+
+def lzma_memory(dictionary_size, streams=1):
+    # Compression memory of `streams` LZMA2 encoders running side by side
+    return int(dictionary_size * LZMA_MEMORY_FACTOR) * max(1, streams) + JOB_OVERHEAD
+
+
+class MemoryBudget:
+    # Bookkeeping for the memory running jobs may use. The scheduler asks
+    # for each job's estimate before submitting it and gives it back when
+    # the job is collected; while the budget is used up it waits for jobs
+    # to finish instead of starting more. A job larger than the whole
+    # budget still runs, but only once nothing else is running.
+    def __init__(self, limit):
+        self.limit = limit
+        self.reserved = 0
+
+    def fit(self, nbytes):
+        return min(nbytes, self.limit)
+
+    def try_reserve(self, nbytes):
+        nbytes = self.fit(nbytes)
+        if self.reserved and self.reserved + nbytes > self.limit:
+            return False
+        self.reserved += nbytes
+        return True
+
+    def release(self, nbytes):
+        self.reserved = max(0, self.reserved - self.fit(nbytes))
@@ -0,0 +1,320 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds between two metrics files written during a run
+WRITE_INTERVAL = 10.0
+
+JSON_LINES = 'json'
+PROMETHEUS = 'prometheus'
+METRICS_FORMATS = (JSON_LINES, PROMETHEUS)
+PROMETHEUS_PREFIX = 'compressor_'
+
+CPROFILE = 'cprofile'
+TRACEMALLOC = 'tracemalloc'
+CAPTURE_MODES = (CPROFILE, TRACEMALLOC)
+# Allocation sites listed in the tracemalloc report
+TRACEMALLOC_TOP = 50
+# From 3.12 cProfile runs on sys.monitoring: one profiler per process, and
+# it sees every thread
+SHARED_PROFILER = sys.version_info >= (3, 12)
+
+
+def metric_key(name, labels):
+    # 'skipped{reason="unchanged"}', the same in both output formats
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{key}="{value}"' for key, value in sorted(labels.items())) + '}'
+
+
+class Metrics:
+    # Counters, per-phase timings and gauges of one run, updated from any
+    # thread. Phases accumulate seconds and calls; gauges keep their last
+    # and highest value, and watched gauges are read when a snapshot is
+    # taken (queue sizes).
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.start_clock = time.perf_counter()
+        self.counters = {}
+        self.phases = {}
+        self.gauges = {}
+        self.watched = {}
+
+    def count(self, name, n=1, **labels):
+        key = metric_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def observe(self, phase, seconds):
+        with self.lock:
+            total = self.phases.setdefault(phase, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+
+    def gauge(self, name, value, **labels):
+        key = metric_key(name, labels)
+        with self.lock:
+            _, peak = self.gauges.get(key, (0, value))
+            self.gauges[key] = (value, max(peak, value))
+
+    def watch(self, name, read, **labels):
+        key = metric_key(name, labels)
+        with self.lock:
+            self.watched[key] = read
+        self._sample(key, read)
+
+    def unwatch(self, name, **labels):
+        # The last value read stays in the snapshots
+        key = metric_key(name, labels)
+        with self.lock:
+            read = self.watched.pop(key, None)
+        if read:
+            self._sample(key, read)
+
+    def _sample(self, key, read):
+        try:
+            value = read()
+        except Exception:
+            return
+        with self.lock:
+            _, peak = self.gauges.get(key, (0, value))
+            self.gauges[key] = (value, max(peak, value))
+
+    def snapshot(self):
+        for key, read in list(self.watched.items()):
+            self._sample(key, read)
+
+        with self.lock:
+            elapsed = time.perf_counter() - self.start_clock
+            counters = dict(self.counters)
+            phases = {phase: {'seconds': seconds, 'calls': calls} for phase, (seconds, calls) in self.phases.items()}
+            gauges = {key: {'value': value, 'max': peak} for key, (value, peak) in self.gauges.items()}
+        items = sum(value for key, value in counters.items() if key.startswith('items{'))
+        return {
+            'time': time.time(),
+            'elapsed_seconds': elapsed,
+            'items_per_second': items / elapsed if elapsed else 0.0,
+            'bytes_per_second': counters.get('bytes_read', 0) / elapsed if elapsed else 0.0,
+            'counters': counters,
+            'phases': phases,
+            'gauges': gauges,
+        }
+
+
+def split_key(key):
+    # ('skipped', '{reason="unchanged"}') from a metric_key
+    name, brace, labels = key.partition('{')
+    return name, brace + labels
+
+
+def format_prometheus(snapshot):
+    # Text exposition format, for node_exporter's textfile collector
+    lines = []
+
+    def family(name, kind, samples):
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}{name} {kind}")
+        for key, value in samples:
+            lines.append(f"{PROMETHEUS_PREFIX}{key} {value}")
+
+    family('elapsed_seconds', 'gauge', [('elapsed_seconds', snapshot['elapsed_seconds'])])
+    family('items_per_second', 'gauge', [('items_per_second', snapshot['items_per_second'])])
+    family('bytes_per_second', 'gauge', [('bytes_per_second', snapshot['bytes_per_second'])])
+    by_name = {}
+    for key, value in sorted(snapshot['counters'].items()):
+        name, labels = split_key(key)
+        by_name.setdefault(name + '_total', []).append((name + '_total' + labels, value))
+    for name, samples in by_name.items():
+        family(name, 'counter', samples)
+    phases = sorted(snapshot['phases'].items())
+    family('phase_seconds_total', 'counter',
+           [(metric_key('phase_seconds_total', {'phase': phase}), total['seconds']) for phase, total in phases])
+    family('phase_calls_total', 'counter',
+           [(metric_key('phase_calls_total', {'phase': phase}), total['calls']) for phase, total in phases])
+    by_name = {}
+    for key, gauge in sorted(snapshot['gauges'].items()):
+        name, labels = split_key(key)
+        by_name.setdefault(name, []).append((name + labels, gauge['value']))
+        by_name.setdefault(name + '_max', []).append((name + '_max' + labels, gauge['max']))
+    for name, samples in by_name.items():
+        family(name, 'gauge', samples)
+    return "\n".join(lines) + "\n"
+
+
+class MetricsWriter:
+    # Writes snapshots of metrics to path every interval seconds and once
+    # more when stopped: JSON lines are appended, a Prometheus file is
+    # replaced as a whole so a scraper never reads half of it
+    def __init__(self, metrics, path, metrics_format=None, interval=WRITE_INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        if metrics_format is None:
+            metrics_format = PROMETHEUS if path.endswith('.prom') else JSON_LINES
+        self.format = metrics_format
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        if self.format == JSON_LINES:
+            # One file per run; a rerun starts it over
+            open(path, 'w').close()
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.write()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        snapshot = self.metrics.snapshot()
+        if self.format == JSON_LINES:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(snapshot) + "\n")
+            return
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(format_prometheus(snapshot))
+        os.replace(temp_path, self.path)
+
+
+class Capture:
+    # Optional profiling of a run. cprofile profiles each thread that runs
+    # under profiled() (the manifest reader, discovery and the scheduler
+    # loop) into <directory>/<name>.pstats. On Python 3.12+ the sections
+    # that overlap share one profiler instead, written to
+    # <name>+<name>...pstats once the last of them ends. tracemalloc traces
+    # the whole process and writes the largest allocation sites when
+    # stopped.
+    def __init__(self, mode, directory='.'):
+        self.mode = mode
+        self.directory = directory
+        self.lock = threading.Lock()
+        # Shared profiler (3.12+), sections running under it and the names
+        # of all sections it has covered
+        self.shared = None
+        self.shared_active = 0
+        self.shared_names = []
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if self.mode == TRACEMALLOC:
+            import tracemalloc
+            tracemalloc.start(10)
+        return self
+
+    def stop(self):
+        if self.mode != TRACEMALLOC:
+            return
+        import tracemalloc
+
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(os.path.join(self.directory, 'tracemalloc.txt'), 'w', encoding='utf-8') as f:
+            f.write(f"current: {current} bytes\npeak: {peak} bytes\n\n")
+            for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                f.write(f"{stat}\n")
+
+    @contextmanager
+    def profiled(self, name):
+        if self.mode != CPROFILE:
+            yield
+            return
+        if SHARED_PROFILER:
+            with self._shared_profiled(name):
+                yield
+            return
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(self.directory, f"{name}.pstats"))
+
+    @contextmanager
+    def _shared_profiled(self, name):
+        import cProfile
+
+        with self.lock:
+            if not self.shared_active:
+                self.shared = cProfile.Profile()
+                self.shared_names = []
+                try:
+                    self.shared.enable()
+                except ValueError:
+                    # Another profiler or a debugger is active; run unprofiled
+                    self.shared = None
+            self.shared_active += 1
+            if name not in self.shared_names:
+                self.shared_names.append(name)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.shared_active -= 1
+                if not self.shared_active and self.shared:
+                    self.shared.disable()
+                    path = os.path.join(self.directory, f"{'+'.join(self.shared_names)}.pstats")
+                    self.shared.dump_stats(path)
+                    self.shared = None
+
+
+# The run's Metrics and Capture, when installed; the helpers below do
+# nothing otherwise, so instrumented code costs next to nothing by default
+_metrics = None
+_capture = None
+
+
+def install_metrics(metrics, capture=None):
+    global _metrics, _capture
+    _metrics = metrics
+    _capture = capture
+
+
+def installed_metrics():
+    return _metrics
+
+
+def count(name, n=1, **labels):
+    if _metrics:
+        _metrics.count(name, n, **labels)
+
+
+def set_gauge(name, value, **labels):
+    if _metrics:
+        _metrics.gauge(name, value, **labels)
+
+
+@contextmanager
+def timed(phase):
+    if _metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _metrics.observe(phase, time.perf_counter() - start)
+
+
+def profiled(name):
+    if _capture is None:
+        return _no_capture()
+    return _capture.profiled(name)
+
+
+@contextmanager
+def _no_capture():
+    yield
@@ -0,0 +1,277 @@
+import os
+import struct
+import threading
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Members are read and deflated in pieces of this size. A file larger than
+# one chunk is deflated by several threads at once: every chunk but the
+# last ends with a sync flush, so the pieces concatenate into one valid
+# deflate stream, and each chunk is primed with the 32 KB before it so
+# the ratio stays close to a single-threaded deflate.
+CHUNK_SIZE = 1024 * 1024
+DEFLATE_WINDOW = 32 * 1024
+
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+END_RECORD = struct.Struct('<IHHHHIIH')
+ZIP64_END_RECORD = struct.Struct('<IQHHIIQQQQ')
+ZIP64_LOCATOR = struct.Struct('<IIQI')
+
+LOCAL_SIGNATURE = 0x04034b50
+CENTRAL_SIGNATURE = 0x02014b50
+END_SIGNATURE = 0x06054b50
+ZIP64_END_SIGNATURE = 0x06064b50
+ZIP64_LOCATOR_SIGNATURE = 0x07064b50
+ZIP64_EXTRA_ID = 0x0001
+UTF8_FLAG = 0x800
+
+VERSION_DEFLATE = 20
+VERSION_ZIP64 = 45
+# Archives are marked as written on Unix, like zipfile does outside Windows
+CREATE_SYSTEM = 0 if os.name == 'nt' else 3
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def deflate_pool():
+    # One pool per process shared by every archive being written, so the
+    # number of deflating threads stays at the number of cores however
+    # many archives are open. zlib releases the GIL while it works.
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="deflate")
+        return _pool
+
+
+def deflate_chunk(data, level, primer, last):
+    if primer:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=primer)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def _done(data):
+    future = Future()
+    future.set_result(data)
+    return future
+
+
+def _dos_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+def _encode_name(name):
+    try:
+        return name.encode('ascii'), 0
+    except UnicodeEncodeError:
+        return name.encode('utf-8'), UTF8_FLAG
+
+
+class _Member:
+    def __init__(self, zinfo, offset, zip64):
+        self.zinfo = zinfo
+        self.name, self.flags = _encode_name(zinfo.filename)
+        self.offset = offset
+        self.zip64 = zip64
+        self.crc = 0
+        self.compressed_size = 0
+        self.file_size = 0
+
+
+class ParallelZipWriter:
+    # Writes a zip archive whose members are deflated on the shared thread
+    # pool. The thread calling add() reads the files and is the only one
+    # writing to the archive: chunk results are appended strictly in order,
+    # and at most `window` chunks are in flight. Files are read into a
+    # fixed set of reused buffers, so memory stays at memory_needed()
+    # whatever the size of the files.
+    # Local headers are rewritten once a member's CRC and sizes are known,
+    # so the output has to be a seekable file. ZIP64 records are added
+    # whenever a size, offset or the member count needs them.
+    def __init__(self, path, window=4, chunk_size=CHUNK_SIZE):
+        self.fp = open(path, 'wb')
+        self.window = max(1, window)
+        self.chunk_size = chunk_size
+        self.pending = deque()
+        # Read buffers not in use; at most window + 1 are ever allocated
+        self.free_buffers = []
+        self.members = []
+        # Member being read (by add) and member being written (by _flush)
+        self.current = None
+        self.writing = None
+        self.written = 0
+
+    @staticmethod
+    def memory_needed(window, chunk_size=CHUNK_SIZE):
+        # Read buffers plus the deflated chunks waiting to be written
+        return (2 * window + 1) * chunk_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add(self, path, arcname, compress_type, level, on_read=None):
+        # level None means zlib's default; on_read(n) is called per chunk read
+        zinfo = zipfile.ZipInfo.from_file(path, arcname)
+        if zinfo.is_dir():
+            raise ValueError(f"Not a file: {path}")
+        zinfo.compress_type = compress_type
+        level = zlib.Z_DEFAULT_COMPRESSION if level is None else level
+
+        with open(path, 'rb') as src:
+            size = os.fstat(src.fileno()).st_size
+            # Same margin zipfile uses: deflate can grow incompressible data
+            zip64 = size * 1.05 > zipfile.ZIP64_LIMIT
+            self._start_member(zinfo, zip64)
+            primer = b''
+            while True:
+                buffer = self.free_buffers.pop() if self.free_buffers else bytearray(self.chunk_size)
+                n = src.readinto(buffer)
+                chunk = memoryview(buffer)[:n]
+                # A short read is the end of the file; a file ending exactly
+                # on a chunk boundary gets an empty last chunk
+                last = n < self.chunk_size
+                self.current.crc = zlib.crc32(chunk, self.current.crc)
+                self.current.file_size += n
+                if compress_type == zipfile.ZIP_STORED:
+                    future = _done(chunk)
+                else:
+                    future = deflate_pool().submit(deflate_chunk, chunk, level, primer, last)
+                    # Copied: the buffer is reused once this chunk is written
+                    primer = bytes(chunk[-DEFLATE_WINDOW:])
+                self._queue((future, buffer))
+                if on_read and n:
+                    on_read(n)
+                if last:
+                    break
+        self._queue(None)
+
+    def _start_member(self, zinfo, zip64):
+        self.current = _Member(zinfo, None, zip64)
+        self._queue(self.current)
+
+    def _queue(self, entry):
+        # Entries: a _Member (write its header), (Future, buffer) for chunk
+        # data or None (the member is complete)
+        self.pending.append(entry)
+        self._flush(self.window)
+
+    def _flush(self, keep):
+        # Writes everything at the head of the queue that is ready, and
+        # waits for chunks while more than `keep` entries are queued
+        while self.pending:
+            entry = self.pending[0]
+            if isinstance(entry, tuple) and not entry[0].done() and len(self.pending) <= keep:
+                break
+            self.pending.popleft()
+            if isinstance(entry, _Member):
+                self._write_local_header(entry)
+            elif entry is None:
+                self._finish_member()
+            else:
+                future, buffer = entry
+                data = future.result()
+                self.fp.write(data)
+                self.written += len(data)
+                del data
+                self.free_buffers.append(buffer)
+
+    def _local_header(self, member, crc, compressed_size, file_size):
+        zinfo = member.zinfo
+        extra = b''
+        version = VERSION_DEFLATE
+        if member.zip64:
+            extra = struct.pack('<HHQQ', ZIP64_EXTRA_ID, 16, file_size, compressed_size)
+            compressed_size = file_size = 0xFFFFFFFF
+            version = VERSION_ZIP64
+        dos_time, dos_date = _dos_time(zinfo.date_time)
+        return LOCAL_HEADER.pack(
+            LOCAL_SIGNATURE, version, member.flags, zinfo.compress_type, dos_time, dos_date,
+            crc, compressed_size, file_size, len(member.name), len(extra)
+        ) + member.name + extra
+
+    def _write_local_header(self, member):
+        member.offset = self.fp.tell()
+        self.fp.write(self._local_header(member, 0, 0, 0))
+        self.written = 0
+        self.writing = member
+
+    def _finish_member(self):
+        member = self.writing
+        member.compressed_size = self.written
+        if not member.zip64 and max(member.file_size, member.compressed_size) > zipfile.ZIP64_LIMIT:
+            raise zipfile.LargeZipFile(f"{member.zinfo.filename} grew past the ZIP64 limit while being read")
+        end = self.fp.tell()
+        self.fp.seek(member.offset)
+        self.fp.write(self._local_header(member, member.crc, member.compressed_size, member.file_size))
+        self.fp.seek(end)
+        self.members.append(member)
+
+    def close(self):
+        self._flush(0)
+        start = self.fp.tell()
+        for member in self.members:
+            self.fp.write(self._central_header(member))
+        end = self.fp.tell()
+        self._write_end_record(start, end - start)
+        self.fp.close()
+
+    def abort(self):
+        # Drops the chunks in flight and leaves the file half written for
+        # the caller to remove
+        for entry in self.pending:
+            if isinstance(entry, tuple):
+                entry[0].cancel()
+        self.pending.clear()
+        self.fp.close()
+
+    def _central_header(self, member):
+        zinfo = member.zinfo
+        extra_fields = []
+        file_size, compressed_size, offset = member.file_size, member.compressed_size, member.offset
+        if file_size > zipfile.ZIP64_LIMIT:
+            extra_fields.append(file_size)
+            file_size = 0xFFFFFFFF
+        if compressed_size > zipfile.ZIP64_LIMIT:
+            extra_fields.append(compressed_size)
+            compressed_size = 0xFFFFFFFF
+        if offset > zipfile.ZIP64_LIMIT:
+            extra_fields.append(offset)
+            offset = 0xFFFFFFFF
+        extra = b''
+        version = VERSION_ZIP64 if member.zip64 else VERSION_DEFLATE
+        if extra_fields:
+            extra = struct.pack(f'<HH{len(extra_fields)}Q', ZIP64_EXTRA_ID, 8 * len(extra_fields), *extra_fields)
+            version = VERSION_ZIP64
+        dos_time, dos_date = _dos_time(zinfo.date_time)
+        return CENTRAL_HEADER.pack(
+            CENTRAL_SIGNATURE, (CREATE_SYSTEM << 8) | version, version, member.flags, zinfo.compress_type,
+            dos_time, dos_date, member.crc, compressed_size, file_size, len(member.name), len(extra),
+            0, 0, 0, zinfo.external_attr, offset
+        ) + member.name + extra
+
+    def _write_end_record(self, start, size):
+        count = len(self.members)
+        if count > zipfile.ZIP_FILECOUNT_LIMIT or start > zipfile.ZIP64_LIMIT or size > zipfile.ZIP64_LIMIT:
+            zip64_start = self.fp.tell()
+            self.fp.write(ZIP64_END_RECORD.pack(
+                ZIP64_END_SIGNATURE, ZIP64_END_RECORD.size - 12, (CREATE_SYSTEM << 8) | VERSION_ZIP64,
+                VERSION_ZIP64, 0, 0, count, count, size, start
+            ))
+            self.fp.write(ZIP64_LOCATOR.pack(ZIP64_LOCATOR_SIGNATURE, 0, zip64_start, 1))
+            count = min(count, 0xFFFF)
+            start = min(start, 0xFFFFFFFF)
+            size = min(size, 0xFFFFFFFF)
+        self.fp.write(END_RECORD.pack(END_SIGNATURE, 0, 0, count, count, size, start, 0))
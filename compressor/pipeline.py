@@ -0,0 +1,145 @@
+import queue
+import threading
+import time
+
+from .batching import group_small_items
+from .dedup import Deduplicator
+from .discovery import discover_items
+from .metrics import installed_metrics, profiled
+from .scanner import ScanOptions
+
+# Upper bound on rows/items waiting between two stages; keeps memory flat
+# when the manifest is read faster than the items can be compressed
+QUEUE_SIZE = 1000
+
+_END = object()
+
+
+class _NamedQueue(queue.Queue):
+    # The name labels the queue's metrics
+    def __init__(self, name, maxsize):
+        super().__init__(maxsize)
+        self.name = name
+
+
+def _put(out_queue, value, stop, metrics=None):
+    start = time.perf_counter() if metrics else None
+    while not stop.is_set():
+        try:
+            out_queue.put(value, timeout=0.1)
+            if metrics:
+                metrics.observe(f"{out_queue.name}-queue-full", time.perf_counter() - start)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _drain(in_queue, stop, metrics=None):
+    start = time.perf_counter() if metrics else None
+    while not stop.is_set():
+        try:
+            value = in_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if metrics:
+            metrics.observe(f"{in_queue.name}-queue-empty", time.perf_counter() - start)
+        if value is _END:
+            return
+        yield value
+        if metrics:
+            start = time.perf_counter()
+
+
+class _Stage(threading.Thread):
+    # Moves everything produced by source into out_queue, then an end marker
+    def __init__(self, name, source, out_queue, stop):
+        super().__init__(name=name, daemon=True)
+        self.source = source
+        self.out_queue = out_queue
+        self.stop = stop
+        self.error = None
+
+    def run(self):
+        # With metrics, the time spent producing each value (the stage's own
+        # work plus waiting for its input) and waiting for room downstream
+        # are recorded separately
+        metrics = installed_metrics()
+        try:
+            with profiled(self.name):
+                source = iter(self.source)
+                while True:
+                    start = time.perf_counter() if metrics else None
+                    value = next(source, _END)
+                    if metrics:
+                        metrics.observe(self.name, time.perf_counter() - start)
+                    if value is _END:
+                        break
+                    if not _put(self.out_queue, value, self.stop, metrics):
+                        return
+        except BaseException as e:
+            self.error = e
+        finally:
+            _put(self.out_queue, _END, self.stop)
+
+
+def _count_totals(items, progress):
+    for item in items:
+        progress.add_total(item.size)
+        yield item
+    progress.set_total_final()
+
+
+def _journal_queued(items, journal):
+    for item in items:
+        journal.queued(item)
+        yield item
+
+
+def run_pipeline(rows, scheduler, on_status=None, on_result=None, on_error=None, batching=None,
+                 progress=None, scan_options=None):
+    # manifest parsing -> path validation/stat -> compression, each stage in
+    # its own thread and connected by bounded queues, so the first archives
+    # are written while the manifest is still being read
+    stop = threading.Event()
+    rows_queue = _NamedQueue("rows", QUEUE_SIZE)
+    items_queue = _NamedQueue("items", QUEUE_SIZE)
+    metrics = installed_metrics()
+    if metrics:
+        for watched in (rows_queue, items_queue):
+            metrics.watch('queue_depth', watched.qsize, queue=watched.name)
+
+    items = discover_items(_drain(rows_queue, stop, metrics), on_status, scan_options or ScanOptions())
+    # Before batching, so a batch never holds a copy of another file
+    items = Deduplicator(scheduler.dedup is not None, on_status).filter(items)
+    if batching:
+        items = group_small_items(items, batching)
+    if progress:
+        # Totals grow as discovery runs ahead of compression
+        items = _count_totals(items, progress)
+    if scheduler.journal:
+        items = _journal_queued(items, scheduler.journal)
+
+    stages = [
+        _Stage("manifest-reader", rows, rows_queue, stop),
+        _Stage("path-discovery", items, items_queue, stop),
+    ]
+    for stage in stages:
+        stage.start()
+
+    try:
+        with profiled("scheduler"):
+            summary = scheduler.run(_drain(items_queue, stop, metrics), on_result=on_result, on_error=on_error,
+                                    progress=progress)
+    finally:
+        stop.set()
+        for stage in stages:
+            stage.join()
+        if metrics:
+            for watched in (rows_queue, items_queue):
+                metrics.unwatch('queue_depth', queue=watched.name)
+
+    for stage in stages:
+        if stage.error is not None:
+            raise stage.error
+    return summary
@@ -0,0 +1,162 @@
+import os
+import zipfile
+import zlib
+from collections import namedtuple
+from itertools import islice
+
+from .filetypes import is_incompressible
+from .items import BATCH
+from .scanner import iter_files
+
+AUTO = 'auto'
+
+# zip_method/zip_level: zipfile compression per member. seven_zip_switches:
+# method switches for the 7-Zip command line. lzma_options: the same
+# settings as an LZMA2 filter for py7zr; None means stored.
+Profile = namedtuple('Profile', [
+    'name', 'zip_method', 'zip_level', 'seven_zip_switches', 'lzma_options'
+])
+
+PROFILES = {
+    'store': Profile('store', zipfile.ZIP_STORED, None, ['-mx=0'], None),
+    'fast': Profile('fast', zipfile.ZIP_DEFLATED, 1, [
+        '-mx=1',  # Fastest LZMA2 level
+        '-m0=lzma2',  # Use LZMA2 compression method
+        '-ms=on',  # Enable solid mode
+    ], {'preset': 1}),
+    'balanced': Profile('balanced', zipfile.ZIP_DEFLATED, 6, [
+        '-mx=5',  # Normal compression
+        '-m0=lzma2',  # Use LZMA2 compression method
+        '-md=16m',  # Set dictionary size
+        '-ms=on',  # Enable solid mode
+    ], {'preset': 5, 'dict_size': 16 * 1024 * 1024}),
+    'max': Profile('max', zipfile.ZIP_DEFLATED, 9, [
+        '-mx=9',  # Maximum compression
+        '-m0=lzma2',  # Use LZMA2 compression method
+        '-mfb=64',  # Set number of fast bytes
+        '-md=32m',  # Set dictionary size
+        '-ms=on',  # Enable solid mode
+    ], {'preset': 9, 'dict_size': 32 * 1024 * 1024, 'nice_len': 64}),
+}
+
+PROFILE_CHOICES = ('store', 'fast', 'balanced', 'max', AUTO)
+
+# Dictionary size of each lzma preset, for profiles that do not set one
+PRESET_DICTIONARY_SIZES = {
+    0: 256 * 1024, 1: 1 << 20, 2: 2 << 20, 3: 4 << 20, 4: 4 << 20,
+    5: 8 << 20, 6: 8 << 20, 7: 16 << 20, 8: 32 << 20, 9: 64 << 20,
+}
+
+# Auto mode: a few blocks from each file are deflated at level 1 and the
+# resulting ratio (compressed / original) picks the profile. Level 1 is a
+# cheap, conservative estimate of what the heavier settings can do.
+SAMPLE_BLOCK_SIZE = 64 * 1024
+SAMPLE_BLOCKS = 3
+# Files looked at when sampling a folder or batch
+SAMPLE_FILES = 8
+
+# (ratio upper bound, profile): first match wins
+RATIO_PROFILES = (
+    (0.50, 'max'),
+    (0.80, 'balanced'),
+    (0.95, 'fast'),
+)
+
+
+def default_profile(archive_format):
+    # What each format used before profiles existed: zipfile's default
+    # deflate level, and 7-Zip's -mx=9
+    return 'max' if archive_format == '7z' else 'balanced'
+
+
+def dictionary_size(profile):
+    # LZMA dictionary of a profile, 0 when it stores
+    if profile.lzma_options is None:
+        return 0
+    options = profile.lzma_options
+    return options.get('dict_size') or PRESET_DICTIONARY_SIZES[options.get('preset', 6)]
+
+
+def read_sample(path):
+    # Start, middle and end of the file, so a header or trailer alone does
+    # not decide the verdict
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= SAMPLE_BLOCK_SIZE * SAMPLE_BLOCKS:
+            return f.read()
+        blocks = []
+        step = (size - SAMPLE_BLOCK_SIZE) // (SAMPLE_BLOCKS - 1)
+        for i in range(SAMPLE_BLOCKS):
+            f.seek(i * step)
+            blocks.append(f.read(SAMPLE_BLOCK_SIZE))
+        return b''.join(blocks)
+
+
+def sample_ratio(data):
+    if not data:
+        return 1.0
+    return len(zlib.compress(data, 1)) / len(data)
+
+
+def profile_for_ratio(ratio):
+    for limit, name in RATIO_PROFILES:
+        if ratio <= limit:
+            return PROFILES[name]
+    return PROFILES['store']
+
+
+def sample_files(item):
+    # (path, size, mtime) of the files that represent the item when sampling
+    if item.kind == BATCH:
+        return [(member.path, member.size, member.mtime) for member in item.members[:SAMPLE_FILES]]
+    if not item.is_dir:
+        return [(item.path, item.size, item.mtime)]
+
+    files = item.contents.files() if item.contents is not None else iter_files(item.path)
+    return [(path, size, mtime) for path, _, size, mtime in islice(files, SAMPLE_FILES)]
+
+
+def estimate_ratio(files):
+    # Size-weighted ratio over the sampled (path, size, mtime) files
+    compressed = total = 0
+    for path, size, mtime in files:
+        if is_incompressible(path, size, mtime):
+            # Counted as a full sample that does not shrink, without reading it
+            compressed += SAMPLE_BLOCK_SIZE * SAMPLE_BLOCKS
+            total += SAMPLE_BLOCK_SIZE * SAMPLE_BLOCKS
+            continue
+        try:
+            data = read_sample(path)
+        except OSError:
+            continue
+        compressed += sample_ratio(data) * len(data)
+        total += len(data)
+    return compressed / total if total else 1.0
+
+
+def item_is_incompressible(item):
+    if item.kind == BATCH:
+        return all(is_incompressible(member.path, member.size, member.mtime) for member in item.members)
+    if item.is_dir:
+        return False
+    return is_incompressible(item.path, item.size, item.mtime)
+
+
+def resolve_profile(name, item):
+    # One profile for a whole archive. Content that is already dense is
+    # stored whatever the profile: deflating it costs CPU for ~1%.
+    if item_is_incompressible(item):
+        return PROFILES['store']
+    if name != AUTO:
+        return PROFILES[name]
+    return profile_for_ratio(estimate_ratio(sample_files(item)))
+
+
+def resolve_file_profile(name, path, size=None, mtime=None):
+    # Per-file choice, for formats that can compress each member differently.
+    # size and mtime from a scan spare the classifier a stat call.
+    if is_incompressible(path, size, mtime):
+        return PROFILES['store']
+    if name != AUTO:
+        return PROFILES[name]
+    return profile_for_ratio(estimate_ratio([(path, size, mtime)]))
@@ -0,0 +1,197 @@
+import queue
+import re
+import threading
+import time
+from collections import deque, namedtuple
+
+# Seconds of history the transfer rate is averaged over
+RATE_WINDOW = 10.0
+# Minimum seconds between two published progress snapshots
+REPORT_INTERVAL = 0.25
+
+# workers: [(worker number, item name, fraction of that item done), ...]
+ProgressSnapshot = namedtuple('ProgressSnapshot', [
+    'done_bytes', 'total_bytes', 'total_final', 'items_done', 'items_total',
+    'bytes_per_second', 'eta_seconds', 'workers'
+])
+
+SEVEN_ZIP_PERCENT = re.compile(rb'(\d{1,3})%')
+
+
+# Worker threads report through a sink, the tracker's handle() while a
+# run is shown. Messages are plain tuples: ('start', key, worker, name,
+# size), ('bytes', key, n) and ('fraction', key, fraction).
+_sink = None
+
+
+def install_sink(sink):
+    global _sink
+    _sink = sink
+
+
+def worker_id():
+    return threading.get_ident()
+
+
+def report_start(key, name, size):
+    if _sink:
+        _sink(('start', key, worker_id(), name, size))
+
+
+def report_bytes(key, nbytes):
+    if _sink and nbytes:
+        _sink(('bytes', key, nbytes))
+
+
+def report_fraction(key, fraction):
+    if _sink:
+        _sink(('fraction', key, fraction))
+
+
+def parse_seven_zip_progress(buffer):
+    # 7-Zip's -bsp1 output redraws " 42% 7 + name" in place with backspaces;
+    # returns the last percentage seen, or None
+    matches = SEVEN_ZIP_PERCENT.findall(buffer)
+    return int(matches[-1]) if matches else None
+
+
+def format_bytes(nbytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if nbytes < 1024:
+            return f"{nbytes:.0f} {unit}" if unit == 'B' else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.1f} TB"
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+def format_snapshot(snapshot):
+    text = f"{format_bytes(snapshot.done_bytes)} / {format_bytes(snapshot.total_bytes)}"
+    text += f", {snapshot.bytes_per_second / (1024 * 1024):.1f} MB/s"
+    if snapshot.eta_seconds is not None:
+        text += f", ETA {format_duration(snapshot.eta_seconds)}"
+    return text
+
+
+class ProgressTracker:
+    # Byte-weighted progress over a run. Totals are added as items are
+    # discovered; workers report bytes read while compressing, and whatever
+    # an item did not report is credited when it finishes.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total_bytes = 0
+        self.total_final = False
+        self.items_total = 0
+        self.items_done = 0
+        self.done_bytes = 0
+        self.active = {}
+        self.worker_numbers = {}
+        self.history = deque()
+        self.changed = True
+
+    def add_total(self, nbytes, items=1):
+        with self.lock:
+            self.total_bytes += nbytes
+            self.items_total += items
+            self.changed = True
+
+    def set_total_final(self):
+        with self.lock:
+            self.total_final = True
+            self.changed = True
+
+    def handle(self, message):
+        kind, key = message[0], message[1]
+        with self.lock:
+            if kind == 'start':
+                worker, name, size = message[2:]
+                number = self.worker_numbers.setdefault(worker, len(self.worker_numbers) + 1)
+                self.active[key] = [number, name, size, 0]
+            elif key in self.active:
+                entry = self.active[key]
+                if kind == 'bytes':
+                    nbytes = min(message[2], entry[2] - entry[3])
+                else:
+                    nbytes = max(0, int(entry[2] * message[2]) - entry[3])
+                entry[3] += nbytes
+                self.done_bytes += nbytes
+            self.changed = True
+
+    def finish(self, key, size):
+        with self.lock:
+            entry = self.active.pop(key, None)
+            reported = entry[3] if entry else 0
+            self.done_bytes += max(0, size - reported)
+            self.items_done += 1
+            self.changed = True
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            self.changed = False
+            self.history.append((now, self.done_bytes))
+            while len(self.history) > 2 and now - self.history[0][0] > RATE_WINDOW:
+                self.history.popleft()
+            start_time, start_bytes = self.history[0]
+            elapsed = now - start_time
+            rate = (self.done_bytes - start_bytes) / elapsed if elapsed > 0 else 0.0
+            remaining = max(0, self.total_bytes - self.done_bytes)
+            eta = remaining / rate if rate > 0 and self.total_final else None
+            workers = sorted(
+                (number, name, reported / size if size else 0.0)
+                for number, name, size, reported in self.active.values()
+            )
+            return ProgressSnapshot(
+                self.done_bytes, self.total_bytes, self.total_final, self.items_done,
+                self.items_total, rate, eta, workers
+            )
+
+
+class ProgressReporter:
+    # Publishes tracker snapshots at most every interval seconds into a
+    # one-slot queue; a slow consumer only ever sees the latest one
+    def __init__(self, tracker, interval=REPORT_INTERVAL):
+        self.tracker = tracker
+        self.interval = interval
+        self.events = queue.Queue(maxsize=1)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="progress-reporter", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self._publish()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            if self.tracker.changed:
+                self._publish()
+
+    def _publish(self):
+        snapshot = self.tracker.snapshot()
+        try:
+            self.events.get_nowait()
+        except queue.Empty:
+            pass
+        self.events.put(snapshot)
+
+    def latest(self):
+        try:
+            return self.events.get_nowait()
+        except queue.Empty:
+            return None
+
+    def get(self, timeout=None):
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
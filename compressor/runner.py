@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+
+from .metrics import count, installed_metrics
+
+# Seconds a child process gets to exit after being asked to, before it
+# is killed
+KILL_GRACE = 3.0
+# Bytes read from a child's output at a time
+READ_SIZE = 4096
+# Output kept from a child for error messages
+OUTPUT_LIMIT = 64 * 1024
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobTimeout(Exception):
+    pass
+
+
+class JobControl:
+    # Cancellation and deadlines of the jobs of one run, keyed by item path.
+    # cancel() stops one job or, without a key, the whole run: running
+    # child processes are terminated right away and in-process jobs stop at
+    # their next check(). Jobs not started yet stop before doing anything.
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.all_cancelled = False
+        self.cancelled_keys = set()
+        self.deadlines = {}
+        self.stoppers = {}
+
+    def cancel(self, key=None):
+        with self.lock:
+            if key is None:
+                self.all_cancelled = True
+                stoppers = list(self.stoppers.values())
+            else:
+                self.cancelled_keys.add(key)
+                stoppers = [self.stoppers[key]] if key in self.stoppers else []
+        for stop in stoppers:
+            stop()
+
+    def is_cancelled(self, key):
+        return self.all_cancelled or key in self.cancelled_keys
+
+    def remaining(self, key):
+        # Seconds left before the job times out, or None
+        deadline = self.deadlines.get(key)
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def check(self, key):
+        if self.is_cancelled(key):
+            raise JobCancelled("Cancelled")
+        if self.remaining(key) == 0.0:
+            raise JobTimeout(f"Timed out after {self.timeout:g} seconds")
+
+    @contextmanager
+    def job(self, key):
+        self.check(key)
+        if self.timeout:
+            self.deadlines[key] = time.monotonic() + self.timeout
+        try:
+            yield
+        finally:
+            self.deadlines.pop(key, None)
+
+    def register(self, key, stop):
+        # stop() is called when the job is cancelled while it runs
+        with self.lock:
+            self.stoppers[key] = stop
+        if self.is_cancelled(key):
+            stop()
+
+    def unregister(self, key):
+        with self.lock:
+            self.stoppers.pop(key, None)
+
+
+class AsyncProcessRunner:
+    # Runs child processes on one asyncio event loop in a background thread,
+    # however many jobs are running. The calling worker thread only waits
+    # for the result; the loop streams each child's output as it arrives,
+    # enforces the job's deadline and terminates the child on cancel.
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="process-runner", daemon=True)
+        self.thread.start()
+
+    def run(self, cmd, on_output=None, cwd=None, control=None, key=None):
+        # Returns (return code, end of the output); raises JobCancelled or
+        # JobTimeout after stopping the process
+        future = asyncio.run_coroutine_threadsafe(self._run(cmd, on_output, cwd, control, key), self.loop)
+        return future.result()
+
+    async def _run(self, cmd, on_output, cwd, control, key):
+        metrics = installed_metrics()
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, cwd=cwd
+        )
+        if metrics:
+            metrics.observe('subprocess-launch', time.perf_counter() - start)
+        count('subprocess_launches')
+
+        if control:
+            control.register(key, lambda: asyncio.run_coroutine_threadsafe(self._stop(process), self.loop))
+        try:
+            timeout = control.remaining(key) if control else None
+            try:
+                output = await asyncio.wait_for(self._pump(process, on_output), timeout)
+                await process.wait()
+            except asyncio.TimeoutError:
+                await self._stop(process)
+                control.check(key)
+                raise JobTimeout("Timed out")
+        finally:
+            if control:
+                control.unregister(key)
+        if control and control.is_cancelled(key):
+            raise JobCancelled("Cancelled")
+        return process.returncode, output
+
+    async def _pump(self, process, on_output):
+        output = b''
+        while True:
+            chunk = await process.stdout.read(READ_SIZE)
+            if not chunk:
+                return output
+            if on_output:
+                on_output(output[-16:], chunk)
+            output = (output + chunk)[-OUTPUT_LIMIT:]
+
+    async def _stop(self, process):
+        if process.returncode is not None:
+            return
+        try:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), KILL_GRACE)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+        except ProcessLookupError:
+            pass
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def process_runner():
+    # One runner per process, started on first use
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = AsyncProcessRunner()
+        return _runner
@@ -0,0 +1,158 @@
+import fnmatch
+import os
+from array import array
+from collections import namedtuple
+
+# What to do with symbolic links met while scanning:
+# skip them, follow links to files only (folders behind a link are left
+# out, like os.walk does), or follow everything
+SKIP_LINKS = 'skip'
+FILE_LINKS = 'files'
+FOLLOW_LINKS = 'follow'
+SYMLINK_POLICIES = (SKIP_LINKS, FILE_LINKS, FOLLOW_LINKS)
+
+# depth: how many folder levels of a manifest folder are expanded into
+# separate items (0 = the folder is one item, None = every file is one).
+# include/exclude: glob patterns; a pattern with a slash is matched against
+# the path relative to the listed folder, otherwise against the name.
+# Folders are always entered unless excluded; include only filters files.
+ScanOptions = namedtuple('ScanOptions', ['depth', 'include', 'exclude', 'symlinks'],
+                         defaults=[1, (), (), FILE_LINKS])
+
+ScanRecord = namedtuple('ScanRecord', ['path', 'size', 'mtime', 'is_dir'])
+
+
+def _matches(patterns, relpath, name):
+    for pattern in patterns:
+        if fnmatch.fnmatch(relpath if '/' in pattern else name, pattern):
+            return True
+    return False
+
+
+def is_excluded(options, relpath, name, is_dir):
+    if _matches(options.exclude, relpath, name):
+        return True
+    return not is_dir and bool(options.include) and not _matches(options.include, relpath, name)
+
+
+class ScanRecords:
+    # Everything below one folder, stored column-wise: relative paths in a
+    # list and sizes/mtimes/kinds in arrays, so a tree of a million files
+    # costs a few tens of MB instead of a million objects. Folder entries
+    # are kept so empty folders survive; their size is 0.
+    def __init__(self, root):
+        self.root = root
+        self.paths = []
+        self.sizes = array('q')
+        self.mtimes = array('d')
+        self.dirs = array('b')
+        self.total_size = 0
+        self.newest_mtime = 0.0
+        # Set when include/exclude or the symlink policy left something out
+        self.filtered = False
+
+    def append(self, relpath, size, mtime, is_dir):
+        self.paths.append(relpath)
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+        self.dirs.append(is_dir)
+        self.total_size += size
+        self.newest_mtime = max(self.newest_mtime, mtime)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __iter__(self):
+        for i, relpath in enumerate(self.paths):
+            yield ScanRecord(relpath, self.sizes[i], self.mtimes[i], bool(self.dirs[i]))
+
+    def files(self):
+        # (absolute path, relative path, size, mtime) of every file
+        for i, relpath in enumerate(self.paths):
+            if not self.dirs[i]:
+                yield os.path.join(self.root, relpath), relpath, self.sizes[i], self.mtimes[i]
+
+
+def iter_entries(root, options=ScanOptions(), max_depth=None, base=''):
+    # Yields (DirEntry, stat result, is_dir, relative path, depth) for
+    # everything below root, parents before their children; depth 1 is
+    # root's direct children. Entries left out by the filters or the
+    # symlink policy come with DirEntry and stat set to None. Folders at
+    # max_depth are reported but not entered. The stat results come from
+    # scandir's cache where the platform provides one (Windows) and cost
+    # one call per entry otherwise. Unreadable subfolders are left out.
+    # base is root's own path below the listed folder, so patterns with a
+    # slash match the same way wherever the scan starts.
+    follow_dirs = options.symlinks == FOLLOW_LINKS
+    # Folders on the way down from root; only needed when links are
+    # followed, where a link back up the tree would loop forever
+    ancestors = frozenset()
+    if follow_dirs:
+        st = os.stat(root)
+        ancestors = frozenset([(st.st_dev, st.st_ino)])
+
+    stack = [(root, '', 1, ancestors)]
+    first = True
+    while stack:
+        directory, prefix, depth, ancestors = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            if first:
+                raise
+            continue
+        first = False
+        with entries:
+            for entry in entries:
+                relpath = prefix + entry.name
+                try:
+                    if entry.is_symlink():
+                        if options.symlinks == SKIP_LINKS:
+                            yield None, None, False, relpath, depth
+                            continue
+                        is_dir = entry.is_dir()
+                        if is_dir and not follow_dirs:
+                            yield None, None, True, relpath, depth
+                            continue
+                        st = entry.stat()
+                    else:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_excluded(options, base + relpath, entry.name, is_dir):
+                    yield None, None, is_dir, relpath, depth
+                    continue
+                key = None
+                if is_dir and follow_dirs:
+                    key = (st.st_dev, st.st_ino)
+                    if key in ancestors:
+                        yield None, None, True, relpath, depth
+                        continue
+                yield entry, st, is_dir, relpath, depth
+                if is_dir and (max_depth is None or depth < max_depth):
+                    below = ancestors | {key} if key else ancestors
+                    stack.append((entry.path, relpath + '/', depth + 1, below))
+
+
+def scan_tree(root, options=ScanOptions(), base=''):
+    # All files and folders below root as ScanRecords. newest_mtime also
+    # covers root itself: a folder's mtime changes when entries are added,
+    # removed or renamed, the file mtimes catch edits to existing files.
+    records = ScanRecords(root)
+    records.newest_mtime = os.stat(root).st_mtime
+    for entry, st, is_dir, relpath, depth in iter_entries(root, options, base=base):
+        if entry is None:
+            records.filtered = True
+            continue
+        records.append(relpath, 0 if is_dir else st.st_size, st.st_mtime, is_dir)
+    return records
+
+
+
+def iter_files(root, options=ScanOptions()):
+    # (absolute path, relative path, size, mtime) of the files below root,
+    # lazily
+    for entry, st, is_dir, relpath, depth in iter_entries(root, options):
+        if entry is not None and not is_dir:
+            yield entry.path, relpath, st.st_size, st.st_mtime
@@ -0,0 +1,378 @@
+import os
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .batching import INDEX_SUFFIX
+from .dedup import DEDUP_LINK, normalize_path, record_duplicate
+from .items import BATCH, DUPLICATE, FILE
+from .jobs import CANCELLED, DONE, SKIPPED, ArchiveConflict, JobOptions, archive_path_for, describe, remove_file, run_job
+from .memory import MemoryBudget
+from .metrics import count, set_gauge
+from .profiles import default_profile
+from .progress import install_sink
+from .runner import JobCancelled, JobControl
+
+# How many jobs each worker may have queued ahead of it, so a huge item
+# list is fed to the pool gradually instead of all at once
+JOBS_PER_WORKER = 2
+# With a per-device limit, how many items per worker may be held back
+# while their disk is busy, so jobs for other disks can start meanwhile
+LOOKAHEAD_PER_WORKER = 32
+
+
+def run_controlled_job(control, item, backend, options, record):
+    # run_job under the item's deadline, in a worker thread
+    with control.job(item.path):
+        return run_job(item, backend, options, record)
+
+
+def cpu_count():
+    return os.cpu_count() or 1
+
+
+def default_workers(archive_format):
+    cpus = cpu_count()
+    if archive_format == '7z':
+        # LZMA2 already keeps about two threads busy per process
+        return max(1, cpus // 2)
+    return cpus
+
+
+class CompressionScheduler:
+    def __init__(self, backend, workers=None, state=None, hash_sources=False, profile=None, journal=None,
+                 memory_limit=None, output_root=None, device_limit=None, dedup=None, verify=False,
+                 verify_workers=None, job_timeout=None):
+        self.backend = backend
+        self.workers = max(1, workers or default_workers(backend.extension))
+        self.backend.set_workers(self.workers)
+        # cancel() and cancel_item() stop jobs from any thread; with a
+        # job_timeout (seconds) a job running longer is stopped and fails
+        self.control = JobControl(job_timeout)
+        self.backend.set_control(self.control)
+        # With a StateIndex, items are skipped when unchanged since their
+        # archive was written, instead of whenever an archive exists
+        self.state = state
+        # With a RunJournal, every item's progress is logged and items the
+        # journal already has as done are not run again
+        self.journal = journal
+        self.options = JobOptions(
+            incremental=state is not None, hash_sources=hash_sources, profile=profile,
+            checksum_archives=journal is not None, output_root=output_root
+        )
+        # Jobs reserve their estimated peak memory from this budget (bytes)
+        # before they start; None runs as many as there are workers
+        self.memory = MemoryBudget(memory_limit) if memory_limit else None
+        # Jobs reading from or writing to one device (st_dev) at the same
+        # time; None leaves it to the number of workers. With an output
+        # root every job also counts against the output's device.
+        self.device_limit = device_limit
+        self.output_device = os.stat(output_root).st_dev if output_root else None
+        # dedup.DEDUP_MODES: how Duplicates are recorded once the archive
+        # holding their original exists; None when there are none
+        self.dedup = dedup
+        # Every new archive is read back on a separate pool while the next
+        # items are being compressed; an item only counts as done (and is
+        # recorded in the state index and journal) once its archive passed.
+        # A damaged archive is removed and its item compressed once more.
+        self.verify = verify
+        self.verify_workers = max(1, verify_workers or self.workers // 2)
+
+    def cancel(self):
+        # Stops the running jobs and starts no more; run() returns once they
+        # have wound down. Items not read from the list yet are left out.
+        self.control.cancel()
+
+    def cancel_item(self, path):
+        # Stops one item's job, or keeps it from starting
+        self.control.cancel(path)
+
+    def devices_for(self, item):
+        devices = {item.dev}
+        if self.output_device is not None:
+            devices.add(self.output_device)
+        return devices
+
+    def _create_executor(self):
+        # 7z jobs are subprocesses or lzma calls and zip jobs hand deflate
+        # to zlib threads; all of them release the GIL, so threads suffice
+        return ThreadPoolExecutor(max_workers=self.workers)
+
+    def archive_owner(self, archive_path, claimed):
+        # Another source this run or an earlier one wrote archive_path for
+        owner = claimed.get(normalize_path(archive_path))
+        if owner is None and self.state:
+            owner = self.state.archive_owner(archive_path)
+        return owner
+
+    def _submit(self, executor, item):
+        record = self.state.lookup(item.path) if self.state else None
+        if self.journal:
+            self.journal.started(item)
+        return executor.submit(run_controlled_job, self.control, item, self.backend, self.options, record)
+
+    def run(self, items, on_result=None, on_error=None, progress=None):
+        # on_result(item, status, message) and on_error(item, error) are
+        # called from the thread running the scheduler, once per item.
+        # progress is an optional ProgressTracker fed by the workers.
+        summary = {DONE: 0, SKIPPED: 0, 'failed': 0, CANCELLED: 0}
+        max_pending = self.workers * JOBS_PER_WORKER
+
+        def collect(futures):
+            for future in futures:
+                if future in verifying:
+                    checked(future)
+                    continue
+                item = pending.pop(future)
+                device_jobs.subtract(job_devices.pop(future))
+                if self.memory:
+                    self.memory.release(reservations.pop(future))
+                if progress:
+                    progress.finish(item.path, item.size)
+                try:
+                    result = future.result()
+                except JobCancelled as e:
+                    cancelled(item, e)
+                    continue
+                except Exception as e:
+                    failed(item, e)
+                    continue
+                if self.verify and result.status == DONE:
+                    archive_path = archive_path_for(item, self.backend.extension, self.options.output_root)
+                    check = verify_executor.submit(self.backend.verify, item, archive_path)
+                    verifying[check] = (item, result, archive_path)
+                    continue
+                finished(item, result)
+
+        def finished(item, result):
+            if self.state and result.record:
+                self.state.record(result.record)
+            if self.journal:
+                self.journal.finished(item, result.record)
+            count('items', status=result.status)
+            summary[result.status] += 1
+            if on_result:
+                on_result(item, result.status, result.message)
+            if self.dedup:
+                archived(item, archive_path_for(item, self.backend.extension, self.options.output_root))
+
+        def failed(item, error):
+            count('items', status='failed')
+            summary['failed'] += 1
+            if self.journal:
+                self.journal.failed(item, error)
+            if on_error:
+                on_error(item, error)
+
+        def cancelled(item, reason):
+            # The journal keeps it unfinished, so a resumed run does it
+            count('items', status=CANCELLED)
+            summary[CANCELLED] += 1
+            if self.journal:
+                self.journal.failed(item, reason)
+            if on_result:
+                on_result(item, CANCELLED, f"Cancelled {describe(item)}: {item.name}")
+
+        def checked(future):
+            item, result, archive_path = verifying.pop(future)
+            try:
+                future.result()
+            except Exception as e:
+                count('verify_failures')
+                # Never leave a damaged archive where a rerun would skip it
+                remove_file(archive_path)
+                remove_file(archive_path + INDEX_SUFFIX)
+                if self.state:
+                    self.state.forget(item.path)
+                if item.path in retried:
+                    failed(item, e)
+                    return
+                retried.add(item.path)
+                if self.journal:
+                    self.journal.failed(item, e)
+                if progress:
+                    progress.add_total(item.size)
+                waiting.append(item)
+                return
+            finished(item, result._replace(message=f"{result.message} (verified)"))
+
+        def archived(item, archive_path):
+            # Duplicates of the files in this archive can be recorded now
+            members = item.members if item.kind == BATCH else [item] if item.kind == FILE else []
+            for member in members:
+                # Only an archive holding nothing else can be linked to
+                archives[member.path] = (archive_path, item.kind == FILE)
+                for duplicate in duplicates.pop(member.path, ()):
+                    resolve(duplicate)
+
+        def resolve(duplicate):
+            if duplicate.original.path not in archives:
+                # Not compressed (yet); checked again when it is
+                duplicates.setdefault(duplicate.original.path, []).append(duplicate)
+                return
+            original_archive, alone = archives[duplicate.original.path]
+            if not os.path.exists(original_archive):
+                # Nothing to point at (e.g. an already compressed file)
+                waiting.append(duplicate.item)
+                return
+            archive_path = archive_path_for(duplicate, self.backend.extension, self.options.output_root)
+            try:
+                how = record_duplicate(duplicate, original_archive, archive_path, alone and self.dedup == DEDUP_LINK)
+            except OSError as e:
+                count('items', status='failed')
+                summary['failed'] += 1
+                if self.journal:
+                    self.journal.failed(duplicate, e)
+                if on_error:
+                    on_error(duplicate, e)
+                return
+            if progress:
+                progress.finish(duplicate.path, duplicate.size)
+            if self.journal:
+                self.journal.finished(duplicate)
+            count('items', status=SKIPPED)
+            count('skipped', reason='duplicate')
+            summary[SKIPPED] += 1
+            if on_result:
+                on_result(duplicate, SKIPPED,
+                          f"Skipping duplicate of {duplicate.original.path}, {how} {original_archive}: {duplicate.name}")
+
+        def resumed(item, entry):
+            # Finished by the interrupted run this one resumes
+            if progress:
+                progress.finish(item.path, item.size)
+            count('items', status=SKIPPED)
+            count('skipped', reason='resumed')
+            summary[SKIPPED] += 1
+            if on_result:
+                on_result(item, SKIPPED, f"Skipping {describe(item)} finished in the interrupted run: {item.name}")
+            self.journal.carried_over(item, entry)
+            if entry.archive_path:
+                claimed[normalize_path(entry.archive_path)] = item.path
+            if self.dedup and entry.archive_path:
+                archived(item, entry.archive_path)
+
+        def dispatch():
+            # Starts waiting items in order; an item whose device is at its
+            # limit is passed over for now, one that does not fit the memory
+            # budget holds back everything behind it until memory frees up
+            held = []
+            while waiting and len(pending) < max_pending and len(verifying) < max_verifying:
+                item = waiting.popleft()
+                if self.control.is_cancelled(item.path):
+                    if progress:
+                        progress.finish(item.path, item.size)
+                    cancelled(item, JobCancelled("Cancelled"))
+                    continue
+                # Same-stem files (x.txt, x.log) share x.zip; the second one
+                # fails instead of replacing the first one's archive
+                archive_path = archive_path_for(item, self.backend.extension, self.options.output_root)
+                owner = self.archive_owner(archive_path, claimed)
+                if owner is not None and owner != item.path:
+                    if progress:
+                        progress.finish(item.path, item.size)
+                    failed(item, ArchiveConflict(f"{archive_path} is already the archive of {owner}"))
+                    continue
+                claimed[normalize_path(archive_path)] = item.path
+                devices = self.devices_for(item)
+                if self.device_limit and any(device_jobs[device] >= self.device_limit for device in devices):
+                    held.append(item)
+                    continue
+                if self.memory:
+                    needed = self.backend.memory_estimate(item, profile)
+                    if not self.memory.try_reserve(needed):
+                        waiting.appendleft(item)
+                        break
+                future = self._submit(executor, item)
+                pending[future] = item
+                job_devices[future] = devices
+                device_jobs.update(devices)
+                if self.memory:
+                    reservations[future] = needed
+            waiting.extendleft(reversed(held))
+            set_gauge('jobs_pending', len(pending))
+            set_gauge('items_waiting', len(waiting))
+            if self.memory:
+                set_gauge('memory_reserved_bytes', self.memory.reserved)
+
+        def wait_and_collect():
+            done, _ = wait(list(pending) + list(verifying), return_when=FIRST_COMPLETED)
+            collect(done)
+            dispatch()
+
+        self.backend.prepare()
+
+        pending = {}
+        reservations = {}
+        # (archive, holds only this file) of every compressed file by source
+        # path, and Duplicates waiting for the archive of their original
+        archives = {}
+        duplicates = {}
+        # Verification futures -> (item, job result, archive path), and
+        # items already compressed again after a failed verification
+        verifying = {}
+        retried = set()
+        max_verifying = self.verify_workers * JOBS_PER_WORKER
+        verify_executor = None
+        if self.verify:
+            verify_executor = ThreadPoolExecutor(self.verify_workers, thread_name_prefix="verify")
+        job_devices = {}
+        device_jobs = Counter()
+        # Normalized archive path -> source path of every job started
+        claimed = {}
+        waiting = deque()
+        lookahead = max_pending
+        if self.device_limit:
+            lookahead += self.workers * LOOKAHEAD_PER_WORKER
+        profile = self.options.profile or default_profile(self.backend.extension)
+        if progress:
+            install_sink(progress.handle)
+        try:
+            with self._create_executor() as executor:
+                try:
+                    for item in items:
+                        if self.control.all_cancelled:
+                            break
+                        entry = self.journal.completed(item) if self.journal else None
+                        if entry:
+                            resumed(item, entry)
+                            continue
+                        if item.kind == DUPLICATE:
+                            resolve(item)
+                            dispatch()
+                            continue
+                        waiting.append(item)
+                        dispatch()
+                        # Something is always running or being verified while
+                        # items wait: with nothing pending every device and the
+                        # whole memory budget are free for the first waiting item
+                        while len(waiting) >= lookahead:
+                            wait_and_collect()
+
+                    while pending or verifying:
+                        wait_and_collect()
+                    # Originals that failed: their duplicates are compressed
+                    # after all
+                    if not self.control.all_cancelled:
+                        for leftover in duplicates.values():
+                            waiting.extend(duplicate.item for duplicate in leftover)
+                        duplicates.clear()
+                    # After cancel() this reports whatever still waits
+                    dispatch()
+                    while pending or verifying:
+                        wait_and_collect()
+                except BaseException:
+                    # Ctrl+C: stop the running jobs instead of waiting for
+                    # them as the executor shuts down
+                    self.control.cancel()
+                    raise
+        finally:
+            if verify_executor:
+                for check in verifying:
+                    check.cancel()
+                verify_executor.shutdown()
+            install_sink(None)
+
+        if self.state:
+            self.state.commit()
+
+        return summary
@@ -0,0 +1,92 @@
+import sqlite3
+import time
+from collections import namedtuple
+
+STATE_SUFFIX = '.state.sqlite'
+
+# Records are committed in batches; a crash loses at most this many, and
+# those items are simply compressed again on the next run
+COMMIT_EVERY = 100
+
+StateRecord = namedtuple('StateRecord', [
+    'source_path', 'source_size', 'source_mtime', 'source_hash',
+    'archive_path', 'archive_size', 'archive_checksum'
+])
+
+
+class StateIndex:
+    # Persistent record of what each source looked like when its archive was
+    # last written, so reruns skip unchanged items without opening them
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        try:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                " source_path TEXT PRIMARY KEY,"
+                " source_size INTEGER NOT NULL,"
+                " source_mtime REAL NOT NULL,"
+                " source_hash TEXT,"
+                " archive_path TEXT NOT NULL,"
+                " archive_size INTEGER NOT NULL,"
+                " archive_checksum TEXT,"
+                " updated_at REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS items_archive ON items (archive_path)")
+            self.connection.commit()
+        except sqlite3.Error:
+            # e.g. a read-only folder: sqlite only finds out on first write
+            self.connection.close()
+            raise
+        self.uncommitted = 0
+
+    @staticmethod
+    def path_for(manifest_path):
+        return f"{manifest_path}{STATE_SUFFIX}"
+
+    def lookup(self, source_path):
+        row = self.connection.execute(
+            "SELECT source_path, source_size, source_mtime, source_hash,"
+            " archive_path, archive_size, archive_checksum"
+            " FROM items WHERE source_path = ?", (source_path,)
+        ).fetchone()
+        return StateRecord(*row) if row else None
+
+    def archive_owner(self, archive_path):
+        # Source the archive at archive_path was last written for, or None
+        row = self.connection.execute(
+            "SELECT source_path FROM items WHERE archive_path = ?", (archive_path,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def record(self, record):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            tuple(record) + (time.time(),)
+        )
+        self._maybe_commit()
+
+    def forget(self, source_path):
+        self.connection.execute("DELETE FROM items WHERE source_path = ?", (source_path,))
+        self._maybe_commit()
+
+    def _maybe_commit(self):
+        self.uncommitted += 1
+        if self.uncommitted >= COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
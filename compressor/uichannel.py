@@ -0,0 +1,53 @@
+import threading
+from collections import deque
+
+# Per-file lines kept for the log view; older lines are dropped
+LOG_LIMIT = 5000
+# Milliseconds between two drains on the Tk main loop
+DRAIN_INTERVAL_MS = 100
+
+
+class UIChannel:
+    # Hand-off between worker threads and the Tk main loop. Workers only
+    # append under a short lock and never wait for the GUI; the main loop
+    # drains everything with after(). Status updates are coalesced so only
+    # the newest one reaches the label, per-file lines go to a bounded log
+    # buffer and errors are collected so a burst of failures becomes a
+    # single dialog.
+    def __init__(self, log_limit=LOG_LIMIT):
+        self.lock = threading.Lock()
+        self.status = None
+        self.lines = deque(maxlen=log_limit)
+        self.errors = []
+        self.calls = []
+
+    def post_status(self, message):
+        # The label only shows the latest message; every message is logged
+        with self.lock:
+            self.status = message
+            self.lines.append(message)
+
+    def log(self, message):
+        with self.lock:
+            self.lines.append(message)
+
+    def post_error(self, message):
+        with self.lock:
+            self.errors.append(message)
+            self.lines.append(message)
+
+    def call(self, function, *args):
+        # Run function(*args) on the main loop at the next drain
+        with self.lock:
+            self.calls.append((function, args))
+
+    def drain(self):
+        # Returns (latest status or None, new log lines, errors, calls) and
+        # resets the pending state
+        with self.lock:
+            status, self.status = self.status, None
+            lines = list(self.lines)
+            self.lines.clear()
+            errors, self.errors = self.errors, []
+            calls, self.calls = self.calls, []
+        return status, lines, errors, calls
@@ -0,0 +1,110 @@
+import tkinter as tk
+from tkinter import ttk
+
+# Used until the first row has been drawn and can be measured
+DEFAULT_ROW_HEIGHT = 20
+
+
+class VirtualTreeview(tk.Frame):
+    # A Treeview that only holds the rows currently on screen. The data
+    # stays in the caller's model; format_row(index) returns the values for
+    # one row and the widget rewrites its few visible rows whenever the
+    # view scrolls or the model changes, so a million entries cost no more
+    # to show than a dozen.
+    def __init__(self, parent, columns, format_row, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.format_row = format_row
+        self.row_count = 0
+        self.offset = 0
+        self.visible = 1
+        self.row_height = DEFAULT_ROW_HEIGHT
+        self.render_pending = False
+
+        self.tree = ttk.Treeview(self, columns=[name for name, _, _ in columns],
+                                 show="headings", selectmode="none")
+        for name, heading, width in columns:
+            self.tree.heading(name, text=heading)
+            self.tree.column(name, width=width, stretch=(name == columns[1][0]))
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(3))
+
+    def set_row_count(self, count):
+        self.row_count = count
+        self.offset = 0
+        self.invalidate()
+
+    def add_rows(self, count):
+        # Rows appended at the end; the view stays where it is scrolled to
+        self.row_count += count
+        self.invalidate()
+
+    def invalidate(self):
+        # Coalesce any number of model changes into one redraw
+        if not self.render_pending:
+            self.render_pending = True
+            self.after_idle(self.render)
+
+    def render(self):
+        self.render_pending = False
+        self.offset = max(0, min(self.offset, self.row_count - self.visible))
+        shown = min(self.visible, self.row_count - self.offset)
+        existing = len(self.tree.get_children())
+        for row in range(existing, shown):
+            self.tree.insert("", tk.END, iid=str(row))
+        for row in range(shown, existing):
+            self.tree.delete(str(row))
+        for row in range(shown):
+            self.tree.item(str(row), values=self.format_row(self.offset + row))
+        self.update_scrollbar()
+        self.measure_rows()
+
+    def update_scrollbar(self):
+        if self.row_count:
+            first = self.offset / self.row_count
+            last = min(1.0, (self.offset + self.visible) / self.row_count)
+        else:
+            first, last = 0.0, 1.0
+        self.scrollbar.set(first, last)
+
+    def measure_rows(self):
+        # The real row height depends on the theme and font
+        bbox = self.tree.bbox("0") if self.tree.exists("0") else None
+        if bbox and bbox[3] != self.row_height:
+            self.row_height = bbox[3]
+            self.on_resize()
+
+    def on_resize(self, event=None):
+        top = DEFAULT_ROW_HEIGHT
+        bbox = self.tree.bbox("0") if self.tree.exists("0") else None
+        if bbox:
+            top = bbox[1]
+        visible = max(1, (self.tree.winfo_height() - top) // self.row_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.invalidate()
+
+    def scroll(self, rows):
+        offset = max(0, min(self.offset + rows, self.row_count - self.visible))
+        if offset != self.offset:
+            self.offset = offset
+            self.invalidate()
+
+    def on_mousewheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll(-3 * delta)
+
+    def yview(self, *args):
+        # Scrollbar protocol: ('moveto', fraction) or ('scroll', n, what)
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * self.row_count)
+            self.invalidate()
+        elif args[0] == "scroll":
+            step = self.visible if args[2] == "pages" else 1
+            self.scroll(int(args[1]) * step)